@@ -0,0 +1,168 @@
+"""
+NetGuard - Alta y exportación masiva de usuarios.
+
+La entrada se lee en streaming y se procesa por lotes: las contraseñas de
+cada lote se hashean en paralelo en un pool de procesos y el lote se guarda
+con una única escritura (UserStore.add_many). Nunca hay más de dos lotes en
+memoria a la vez.
+
+Formatos (con cabecera en CSV):
+    username,password            contraseñas en claro, se hashean
+    username,password_hash       hashes ya calculados (p. ej. de una exportación)
+"""
+import os
+import sys
+import csv
+import json
+import contextlib
+import time
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auth.passwords import hash_password
+from auth.storage import UserStore
+from log import get_logger
+
+
+log = get_logger("USERS")
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def detect_format(path: str) -> str:
+    return "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def _open(path: str, mode: str):
+    if path == '-':
+        return contextlib.nullcontext(sys.stdin if 'r' in mode else sys.stdout)
+    return open(path, mode, newline='', encoding='utf-8')
+
+
+def read_users(f, fmt: str):
+    """Genera diccionarios {'username', 'password' | 'password_hash'} línea a línea."""
+    if fmt == "csv":
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _split_batch(store: UserStore, rows: list) -> tuple:
+    """Separa un lote en (usuarios con hash ya calculado, usuarios a hashear, inválidos)."""
+    hashed, plain, invalid = [], [], 0
+    for row in rows:
+        username = (row.get('username') or '').strip()
+        if not username:
+            invalid += 1
+        elif row.get('password_hash'):
+            hashed.append((username, row['password_hash']))
+        elif row.get('password'):
+            # No se gasta KDF en usuarios que ya existen (p. ej. al repetir una importación)
+            if store.get(username) is None:
+                plain.append((username, row['password']))
+        else:
+            invalid += 1
+    return hashed, plain, invalid
+
+
+class _Progress:
+
+    def __init__(self, stream=sys.stderr):
+        self.stream = stream
+        self.started = time.monotonic()
+        self.read = 0
+        self.added = 0
+        self.invalid = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def rate(self) -> float:
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def update(self, detail: str = ''):
+        self.stream.write(f"\r  {self.read} procesados{detail}, {self.rate():.0f} usuarios/s")
+        self.stream.flush()
+
+    def finish(self):
+        self.stream.write("\n")
+        self.stream.flush()
+
+
+def import_users(store: UserStore, path: str, fmt: str = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                 workers: int = None) -> dict:
+    fmt = fmt or detect_format(path)
+    workers = workers or os.cpu_count() or 1
+    progress = _Progress()
+    pending = deque()
+
+    def commit(hashed, names, hashes, invalid, count):
+        progress.added += store.add_many(hashed + list(zip(names, hashes)))
+        progress.invalid += invalid
+        progress.read += count
+        progress.update(f", {progress.added} nuevos")
+
+    with _open(path, 'r') as f, ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = read_users(f, fmt)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            hashed, plain, invalid = _split_batch(store, batch)
+            names = [u for u, _ in plain]
+            chunksize = max(1, len(plain) // (workers * 4))
+            # pool.map envía el lote entero; el resultado se consume al guardar
+            hashes = pool.map(hash_password, (p for _, p in plain), chunksize=chunksize)
+            pending.append((hashed, names, hashes, invalid, len(batch)))
+            # Mientras se hashea este lote se guarda el anterior
+            if len(pending) > 1:
+                commit(*pending.popleft())
+        while pending:
+            commit(*pending.popleft())
+
+    progress.finish()
+    summary = {
+        'read': progress.read,
+        'added': progress.added,
+        'skipped': progress.read - progress.added - progress.invalid,
+        'invalid': progress.invalid,
+        'seconds': round(progress.elapsed, 2),
+        'users_per_second': round(progress.rate(), 1),
+    }
+    log.info("Importación de usuarios completada", source=path, **summary)
+    return summary
+
+
+def export_users(store: UserStore, path: str, fmt: str = None) -> dict:
+    """Vuelca usuario y hash en streaming; la salida puede volver a importarse."""
+    fmt = fmt or detect_format(path)
+    progress = _Progress()
+
+    with _open(path, 'w') as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(('username', 'password_hash'))
+        for username, password_hash in store.iter_users():
+            if fmt == "csv":
+                writer.writerow((username, password_hash))
+            else:
+                f.write(json.dumps({'username': username, 'password_hash': password_hash}) + "\n")
+            progress.read += 1
+            if progress.read % DEFAULT_BATCH_SIZE == 0:
+                progress.update()
+
+    progress.update()
+    progress.finish()
+    summary = {
+        'exported': progress.read,
+        'seconds': round(progress.elapsed, 2),
+        'users_per_second': round(progress.rate(), 1),
+    }
+    log.info("Exportación de usuarios completada", target=path, **summary)
+    return summary
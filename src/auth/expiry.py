@@ -0,0 +1,92 @@
+import heapq
+import itertools
+import threading
+import time
+import sys
+import os
+from typing import Callable, Hashable, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log import get_logger
+
+
+log = get_logger("SESSION")
+
+
+class ExpiryScheduler:
+    """
+    Programa la expiración de claves con un min-heap.
+
+    Programar, renovar o cancelar es O(log n) y nunca recorre las entradas:
+    renovar deja la entrada antigua en el heap y `_deadlines` indica cuál es
+    la vigente, así que las obsoletas se descartan al salir del heap. Un
+    thread propio duerme hasta el siguiente vencimiento y llama a
+    `on_expire(key)` fuera de su lock.
+    """
+
+    def __init__(self, on_expire: Callable[[Hashable], None], clock: Callable[[], float] = time.time):
+        self.on_expire = on_expire
+        self.clock = clock
+        self._heap = []          # [(deadline, seq, key)]
+        self._deadlines = {}     # {key: deadline vigente}
+        self._seq = itertools.count()
+        self._cond = threading.Condition(threading.Lock())
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='session-expiry', daemon=True)
+        self._thread.start()
+
+    def schedule(self, key: Hashable, deadline: float):
+        """Programa (o reprograma) la expiración de `key`."""
+        with self._cond:
+            self._deadlines[key] = deadline
+            heapq.heappush(self._heap, (deadline, next(self._seq), key))
+            if len(self._heap) > 2 * len(self._deadlines) + 64:
+                self._compact()
+            if self._heap[0][2] == key:
+                self._cond.notify()
+
+    def cancel(self, key: Hashable):
+        with self._cond:
+            self._deadlines.pop(key, None)
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        return self._deadlines.get(key)
+
+    def _compact(self):
+        """Elimina las entradas obsoletas. Requiere self._cond."""
+        self._heap = [entry for entry in self._heap if self._deadlines.get(entry[2]) == entry[0]]
+        heapq.heapify(self._heap)
+
+    def _pop_due(self) -> list:
+        """Espera al siguiente vencimiento y devuelve las claves vencidas."""
+        with self._cond:
+            while self._running:
+                now = self.clock()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    deadline, _, key = heapq.heappop(self._heap)
+                    if self._deadlines.get(key) == deadline:
+                        del self._deadlines[key]
+                        due.append(key)
+                if due:
+                    return due
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._cond.wait(timeout)
+            return []
+
+    def _run(self):
+        while self._running:
+            for key in self._pop_due():
+                try:
+                    self.on_expire(key)
+                except Exception:
+                    # Un fallo en una expiración no puede parar el thread: las demás siguen
+                    log.error("Error expirando clave", key=key, exc_info=True)
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
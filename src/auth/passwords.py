@@ -0,0 +1,106 @@
+import hashlib
+import hmac
+import os
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    PASSWORD_SCHEME, PBKDF2_ITERATIONS, SCRYPT_N, SCRYPT_R, SCRYPT_P,
+    PASSWORD_WORKERS, PASSWORD_QUEUE_SIZE
+)
+
+
+# Formatos de hash almacenados:
+#   pbkdf2_sha256$<iteraciones>$<salt>$<hash>
+#   scrypt$<n>$<r>$<p>$<salt>$<hash>
+#   <salt>:<sha256>                      (formato heredado, se re-hashea al hacer login)
+
+
+class VerifierBusy(Exception):
+    """La cola de verificación de contraseñas está llena."""
+
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
+
+def hash_password(password: str, scheme: str = PASSWORD_SCHEME) -> str:
+    salt = os.urandom(16)
+    if scheme == "scrypt":
+        digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+    if scheme == "pbkdf2_sha256":
+        digest = _pbkdf2(password, salt, PBKDF2_ITERATIONS)
+        return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt.hex()}${digest.hex()}"
+    raise ValueError(f"Esquema de contraseña desconocido: {scheme}")
+
+
+def verify_password(password: str, stored_hash: str) -> bool:
+    try:
+        if stored_hash.startswith("pbkdf2_sha256$"):
+            _, iterations, salt, digest = stored_hash.split('$')
+            computed = _pbkdf2(password, bytes.fromhex(salt), int(iterations))
+            return hmac.compare_digest(computed.hex(), digest)
+        if stored_hash.startswith("scrypt$"):
+            _, n, r, p, salt, digest = stored_hash.split('$')
+            computed = _scrypt(password, bytes.fromhex(salt), int(n), int(r), int(p))
+            return hmac.compare_digest(computed.hex(), digest)
+        salt, digest = stored_hash.split(':', 1)
+        computed = hashlib.sha256((salt + password).encode()).hexdigest()
+        return hmac.compare_digest(computed, digest)
+    except (ValueError, TypeError):
+        return False
+
+
+def needs_rehash(stored_hash: str, scheme: str = PASSWORD_SCHEME) -> bool:
+    """
+    True si el hash no usa el esquema configurado o sus parámetros son más
+    débiles. Un hash mal formado también se rehace.
+    """
+    try:
+        if scheme == "pbkdf2_sha256" and stored_hash.startswith("pbkdf2_sha256$"):
+            return int(stored_hash.split('$')[1]) < PBKDF2_ITERATIONS
+        if scheme == "scrypt" and stored_hash.startswith("scrypt$"):
+            _, n, r, p, _, _ = stored_hash.split('$')
+            return (int(n), int(r), int(p)) < (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    except (ValueError, TypeError):
+        pass
+    return True
+
+
+class PasswordVerifier:
+    """
+    Pool acotado para el trabajo de KDF, separado de los threads HTTP.
+
+    hashlib libera el GIL durante pbkdf2_hmac/scrypt, así que un pool de
+    threads reparte el cálculo entre núcleos. Como mucho `queue_size` tareas
+    pueden estar en vuelo; por encima, `submit()` lanza VerifierBusy en lugar
+    de encolar sin límite durante un pico de logins.
+    """
+
+    def __init__(self, workers: int = PASSWORD_WORKERS, queue_size: int = PASSWORD_QUEUE_SIZE):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self.rejected = 0
+
+    def submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise VerifierBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,105 @@
+import json
+import os
+import sys
+import threading
+from typing import Dict, Iterable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import SESSION_JOURNAL_FSYNC
+from log import get_logger
+
+
+log = get_logger("SESSION")
+
+# Compactar cuando el diario tenga más de COMPACT_RATIO entradas por sesión
+# viva (y al menos COMPACT_MIN_ENTRIES).
+COMPACT_RATIO = 2
+
+COMPACT_MIN_ENTRIES = 1000
+
+
+class SessionJournal:
+    """
+    Diario de sesiones en disco, sólo de añadido.
+
+    Cada cambio es una línea JSON con el registro completo de la sesión
+    ({"ip": ..., "username": ..., "login_time": ..., "expires": ..., "mac": ...})
+    o una baja ({"ip": ..., "deleted": true}). Al arrancar se reproduce en
+    orden y la última línea de cada IP gana. compact() reescribe el fichero
+    con sólo las sesiones vivas. Una última línea a medio escribir (corte de
+    luz) se ignora.
+    """
+
+    def __init__(self, path: str, fsync: bool = SESSION_JOURNAL_FSYNC):
+        self.path = path
+        self.fsync = fsync
+        self.entries = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = None
+
+    def load(self) -> Dict[str, dict]:
+        sessions = {}
+        entries = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        ip = record['ip']
+                    except (ValueError, KeyError):
+                        continue
+                    entries += 1
+                    if record.get('deleted'):
+                        sessions.pop(ip, None)
+                    else:
+                        sessions[ip] = record
+        except FileNotFoundError:
+            pass
+        self.entries = entries
+        return sessions
+
+    def _append(self, record: dict):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.entries += 1
+
+    def record(self, session: dict):
+        """Guarda el registro completo de una sesión (debe incluir 'ip')."""
+        self._append(session)
+
+    def remove(self, ip_address: str):
+        self._append({'ip': ip_address, 'deleted': True})
+
+    def needs_compaction(self, live: int) -> bool:
+        return self.entries > max(COMPACT_MIN_ENTRIES, COMPACT_RATIO * live)
+
+    def compact(self, sessions: Iterable[dict]):
+        """Reescribe el diario con `sessions`. El llamante debe impedir cambios concurrentes."""
+        tmp_path = f"{self.path}.tmp"
+        count = 0
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for session in sessions:
+                    f.write(json.dumps(session, separators=(',', ':')) + '\n')
+                    count += 1
+                f.flush()
+                os.fsync(f.fileno())
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            os.replace(tmp_path, self.path)
+            self.entries = count
+        log.info("Diario de sesiones compactado", sessions=count)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
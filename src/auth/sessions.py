@@ -1,132 +1,359 @@
 import time
 import threading
 import sys
-import subprocess
-import re
 import os
 from typing import Optional
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import SESSION_TIMEOUT
+from config import (
+    SESSION_TIMEOUT, SESSION_CHECK_INTERVAL, SESSION_PERSIST, SESSION_JOURNAL,
+    MAX_SESSIONS_PER_USER, SESSION_LIMIT_POLICY
+)
+from auth.expiry import ExpiryScheduler
+from auth.session_store import SessionJournal
+from gateway.neighbors import NeighborTable
+from log import get_logger
+
+
+log = get_logger("SESSION")
+security_log = get_logger("SECURITY")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Session:
+    """
+    Registro de una sesión. Es inmutable una vez publicado en
+    SessionManager.sessions: los cambios crean un registro nuevo con replace().
+    """
+
+    __slots__ = ('ip', 'username', 'mac', 'login_time', 'expires', 'bytes_up', 'bytes_down', 'packets')
+
+    def __init__(self, ip: str, username: str, mac: Optional[str], login_time: float, expires: float,
+                 bytes_up: int = 0, bytes_down: int = 0, packets: int = 0):
+        self.ip = ip
+        self.username = username
+        self.mac = mac
+        self.login_time = login_time
+        self.expires = expires
+        self.bytes_up = bytes_up
+        self.bytes_down = bytes_down
+        self.packets = packets
+
+    @property
+    def total_bytes(self) -> int:
+        return self.bytes_up + self.bytes_down
+
+    def replace(self, **changes) -> 'Session':
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return Session(**fields)
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"Session(ip={self.ip!r}, username={self.username!r}, mac={self.mac!r})"
 
 
 class SessionManager:
     
-    def __init__(self, firewall_manager):
+    def __init__(self, firewall_manager, neighbors: NeighborTable = None, journal: SessionJournal = None):
         self.firewall = firewall_manager
+        self.neighbors = neighbors or NeighborTable()
+        if journal is None and SESSION_PERSIST:
+            journal = SessionJournal(os.path.join(BASE_DIR, SESSION_JOURNAL))
+        self.journal = journal
         
-        # Sesiones: {ip: {'username': str, 'login_time': float, 'mac': str}}
+        # Sesiones: {ip: Session}, más dos índices secundarios:
+        #   _by_mac:  {mac: ip}
+        #   _by_user: {usuario: {ip, ...}}
+        # y _reserved {usuario: {ip, ...}} con los logins en curso, que ya
+        # ocupan plaza en MAX_SESSIONS_PER_USER mientras se autoriza la IP.
+        #
+        # Las lecturas de `sessions` no toman el lock. Cada Session es
+        # inmutable una vez publicada: para cambiarla se crea una nueva y se
+        # sustituye con una única asignación en el dict, que es atómica bajo
+        # el GIL. Un lector ve el registro anterior o el nuevo, nunca uno a
+        # medias. `lock` serializa a los escritores y protege los índices.
         self.sessions = {}
+        self._by_mac = {}
+        self._by_user = {}
+        self._reserved = {}
         self.lock = threading.Lock()
         self._running = True
+        # La expiración tiene su propio thread y lock: vence a su hora sin recorrer las sesiones
+        self.expiry = ExpiryScheduler(self._expire)
+        if self.journal is not None:
+            self._restore()
         thread = threading.Thread(target=self._monitor_loop, daemon=True)
         thread.start()
     
     def _monitor_loop(self):
         while self._running:
-            time.sleep(30)
-            self._cleanup_expired()
+            time.sleep(SESSION_CHECK_INTERVAL)
             self._check_mac_spoofing()
+            if self.journal is not None and self.journal.needs_compaction(len(self.sessions)):
+                self._compact_journal()
+    
+    # Índices y diario. Requieren self.lock.
+    
+    def _publish(self, session: Session):
+        self.sessions[session.ip] = session
+        if session.mac:
+            self._by_mac[session.mac] = session.ip
+        self._by_user.setdefault(session.username, set()).add(session.ip)
+        if self.journal is not None:
+            self.journal.record(session.as_dict())
+    
+    def _unpublish(self, ip_address: str) -> Optional[Session]:
+        session = self.sessions.pop(ip_address, None)
+        if session is None:
+            return None
+        if session.mac and self._by_mac.get(session.mac) == ip_address:
+            del self._by_mac[session.mac]
+        ips = self._by_user.get(session.username)
+        if ips is not None:
+            ips.discard(ip_address)
+            if not ips:
+                del self._by_user[session.username]
+        if self.journal is not None:
+            self.journal.remove(ip_address)
+        return session
+    
+    def _user_ips(self, username: str) -> set:
+        return self._by_user.get(username, set()) | self._reserved.get(username, set())
     
-    def _cleanup_expired(self):
+    def _reserve(self, username: str, ip_address: str):
+        self._reserved.setdefault(username, set()).add(ip_address)
+    
+    def _release(self, username: str, ip_address: str):
+        ips = self._reserved.get(username)
+        if ips is not None:
+            ips.discard(ip_address)
+            if not ips:
+                del self._reserved[username]
+    
+    def _restore(self):
+        """Recupera las sesiones vigentes del diario y las reautoriza en un solo lote."""
         now = time.time()
-        expired = []
+        saved = self.journal.load()
+        alive = {ip: data for ip, data in saved.items() if data['expires'] > now and data.get('mac')}
         
+        authorized = self.firewall.authorize_many([(ip, data['mac']) for ip, data in alive.items()])
         with self.lock:
-            for ip, data in self.sessions.items():
-                if now - data['login_time'] > SESSION_TIMEOUT:
-                    expired.append(ip)
+            for ip in authorized:
+                data = alive[ip]
+                self._publish(Session(ip, data['username'], data['mac'], data['login_time'], data['expires'],
+                                      data.get('bytes_up', 0), data.get('bytes_down', 0), data.get('packets', 0)))
+        for ip in authorized:
+            self.expiry.schedule(ip, alive[ip]['expires'])
         
-        for ip in expired:
-            self.end_session(ip)
-            print(f"[SESSION] Sesión expirada: {ip}")
+        self._compact_journal()
+        log.info("Sesiones restauradas", restored=len(authorized),
+                 discarded=len(saved) - len(authorized))
+    
+    def _compact_journal(self):
+        # Con el lock de escritores: ningún cambio puede colarse entre la copia y el reemplazo
+        with self.lock:
+            self.journal.compact(session.as_dict() for session in self.sessions.values())
+    
+    def _expire(self, ip_address: str):
+        session = self.sessions.get(ip_address)
+        # Renovada entre el vencimiento y esta llamada
+        if session is None or session.expires > time.time():
+            return
+        if self.end_session(ip_address):
+            log.info("Sesión expirada", ip=ip_address)
     
     def _check_mac_spoofing(self):
-        spoofed = []
-        
+        """
+        Compara las sesiones con una instantánea de la tabla ARP: revoca las
+        IP cuya MAC cambió (suplantación) y sigue a las MAC que aparecen con
+        otra IP (renovación de DHCP).
+        """
+        table = self.neighbors.snapshot(max_age=0)
         with self.lock:
-            for ip, data in self.sessions.items():
-                if data.get('mac'):
-                    current_mac = self.get_mac_from_ip(ip)
-                    if current_mac and current_mac != data['mac']:
-                        print(f"[SECURITY] ¡Spoofing detectado! IP {ip}: "
-                              f"MAC original {data['mac']} -> actual {current_mac}")
-                        spoofed.append(ip)
+            known = [(session.ip, session.mac) for session in self.sessions.values() if session.mac]
+            by_mac = dict(self._by_mac)
+        
+        spoofed = []
+        for ip, mac in known:
+            current_mac = table.get(ip)
+            if current_mac and current_mac != mac:
+                security_log.warning("Spoofing detectado", ip=ip,
+                                     original_mac=mac, current_mac=current_mac)
+                spoofed.append(ip)
         
-
         for ip in spoofed:
             self.end_session(ip)
-            print(f"[SECURITY] Sesión revocada por suplantación: {ip}")
+            security_log.warning("Sesión revocada por suplantación", ip=ip)
+        
+        for ip, mac in table.items():
+            old_ip = by_mac.get(mac)
+            if old_ip and old_ip != ip and ip not in self.sessions and table.get(old_ip) != mac:
+                self.move_session(mac, ip)
     
     def create_session(self, ip_address: str, username: str) -> bool:
         mac = self.get_mac_from_ip(ip_address)
         
-        # Autorizar en firewall 
-        if not self.firewall.authorize_ip(ip_address, mac):
+        # La plaza se comprueba y se reserva con el mismo lock: los logins
+        # simultáneos del mismo usuario no pueden pasar todos el límite
+        with self.lock:
+            room, evicted = self._make_room(username, ip_address)
+            if room:
+                self._reserve(username, ip_address)
+        if not room:
+            log.warning("Límite de sesiones por usuario alcanzado", user=username, ip=ip_address,
+                        limit=MAX_SESSIONS_PER_USER)
             return False
+        if evicted is not None:
+            self._retire(evicted)
+            log.info("Sesión más antigua cerrada por límite", user=username, ip=evicted.ip)
         
-        with self.lock:
-            self.sessions[ip_address] = {
-                'username': username,
-                'login_time': time.time(),
-                'mac': mac 
-            }
+        try:
+            # Autorizar en firewall 
+            if not self.firewall.authorize_ip(ip_address, mac):
+                return False
+            
+            now = time.time()
+            session = Session(ip_address, username, mac, now, now + SESSION_TIMEOUT)
+            with self.lock:
+                self._unpublish(ip_address)
+                self._publish(session)
+        finally:
+            with self.lock:
+                self._release(username, ip_address)
+        self.expiry.schedule(ip_address, session.expires)
         
-        print(f"[SESSION] Nueva sesión: {username}@{ip_address} (MAC: {mac or 'N/A'})")
+        log.info("Nueva sesión", user=username, ip=ip_address, mac=mac)
         return True
     
-    def end_session(self, ip_address: str) -> bool:
-        mac = None
+    def _make_room(self, username: str, ip_address: str) -> tuple:
+        """
+        Aplica MAX_SESSIONS_PER_USER contando sesiones y logins en curso.
+        Devuelve (hay plaza, sesión desalojada o None); la desalojada ya está
+        fuera de los índices. Requiere self.lock.
+        """
+        if not MAX_SESSIONS_PER_USER:
+            return True, None
+        # Repetir el login desde la misma IP no cuenta como otra sesión
+        ips = self._user_ips(username) - {ip_address}
+        if len(ips) < MAX_SESSIONS_PER_USER:
+            return True, None
+        # Un login en curso no se puede cerrar: sólo se desalojan sesiones publicadas
+        published = [ip for ip in ips if ip in self.sessions]
+        if SESSION_LIMIT_POLICY != "oldest" or not published:
+            return False, None
+        oldest = min(published, key=lambda ip: self.sessions[ip].login_time)
+        return True, self._unpublish(oldest)
+    
+    def renew_session(self, ip_address: str, duration: float = SESSION_TIMEOUT) -> bool:
+        """Extiende la sesión hasta `duration` segundos desde ahora."""
+        expires = time.time() + duration
         with self.lock:
-            if ip_address not in self.sessions:
+            session = self.sessions.get(ip_address)
+            if session is None:
                 return False
-            mac = self.sessions[ip_address].get('mac')
-            del self.sessions[ip_address]
-        
-        self.firewall.revoke_ip(ip_address, mac)
-        print(f"[SESSION] Sesión terminada: {ip_address}")
+            self._publish(session.replace(expires=expires))
+        self.expiry.schedule(ip_address, expires)
+        log.info("Sesión renovada", ip=ip_address, expires=int(expires))
         return True
     
-    def is_authenticated(self, ip_address: str) -> bool:
+    def add_usage(self, deltas: dict) -> list:
+        """
+        Suma tráfico a las sesiones: {ip: (bytes_subida, bytes_bajada, paquetes)}.
+        Devuelve las sesiones actualizadas. No pasa por el diario: el consumo
+        se guarda al compactarlo.
+        """
+        updated = []
+        with self.lock:
+            for ip, (up, down, packets) in deltas.items():
+                session = self.sessions.get(ip)
+                if session is None:
+                    continue
+                session = session.replace(bytes_up=session.bytes_up + up,
+                                          bytes_down=session.bytes_down + down,
+                                          packets=session.packets + packets)
+                self.sessions[ip] = session
+                updated.append(session)
+        return updated
+    
+    def end_session(self, ip_address: str) -> bool:
+        with self.lock:
+            session = self._unpublish(ip_address)
+        if session is None:
+            return False
+        self._retire(session)
+        log.info("Sesión terminada", ip=ip_address)
+        return True
+    
+    def _retire(self, session: Session):
+        """Cancela el vencimiento y revoca la IP de una sesión ya despublicada."""
+        self.expiry.cancel(session.ip)
+        # No se espera a la regla: la sesión ya no existe para el portal
+        self.firewall.revoke_async(session.ip, session.mac)
+    
+    def end_user_sessions(self, username: str) -> int:
+        """Cierra todas las sesiones de un usuario. Devuelve cuántas se cerraron."""
         with self.lock:
-            return ip_address in self.sessions
+            ips = list(self._by_user.get(username, ()))
+        return sum(1 for ip in ips if self.end_session(ip))
     
-    def get_session(self, ip_address: str) -> dict:
+    def move_session(self, mac: str, new_ip: str) -> bool:
+        """Traslada la sesión de `mac` a `new_ip` (la MAC obtuvo otra IP por DHCP)."""
         with self.lock:
-            return self.sessions.get(ip_address)
+            old_ip = self._by_mac.get(mac)
+            if old_ip is None or old_ip == new_ip or new_ip in self.sessions:
+                return False
+            session = self._unpublish(old_ip)
+            # La sesión sigue ocupando su plaza mientras se autoriza la nueva IP
+            self._reserve(session.username, new_ip)
+        self._retire(session)
         
-    def get_mac_from_ip(self, ip_address: str) -> Optional[str]:
-   
-        mac_pattern = r'([0-9a-fA-F]{2}[:-]){5}[0-9a-fA-F]{2}'
-
-        # Método 1: ip neigh 
         try:
-            result = subprocess.run(
-                ['ip', 'neigh', 'show', ip_address],
-                capture_output=True, text=True, timeout=5
-            )
-            match = re.search(mac_pattern, result.stdout)
-            if match:
-                return match.group(0).lower().replace('-', ':')
-        except:
-            pass
+            if not self.firewall.authorize_ip(new_ip, mac):
+                log.warning("No se pudo trasladar la sesión", user=session.username, old_ip=old_ip, ip=new_ip)
+                return False
+            with self.lock:
+                self._publish(session.replace(ip=new_ip))
+        finally:
+            with self.lock:
+                self._release(session.username, new_ip)
+        self.expiry.schedule(new_ip, session.expires)
+        log.info("Sesión trasladada", user=session.username, mac=mac, old_ip=old_ip, ip=new_ip)
+        return True
+    
+    def is_authenticated(self, ip_address: str) -> bool:
+        return ip_address in self.sessions
+    
+    def get_session(self, ip_address: str) -> Optional[Session]:
+        return self.sessions.get(ip_address)
+    
+    def get_session_by_mac(self, mac: str) -> Optional[Session]:
+        ip_address = self._by_mac.get(mac)
+        return self.sessions.get(ip_address) if ip_address else None
+    
+    def get_user_sessions(self, username: str) -> list:
+        with self.lock:
+            return [self.sessions[ip] for ip in self._by_user.get(username, ())]
         
-        # Método 2: arp -n 
-        try:
-            result = subprocess.run(
-                ['arp', '-n', ip_address],
-                capture_output=True, text=True, timeout=5
-            )
-            match = re.search(mac_pattern, result.stdout)
-            if match:
-                return match.group(0).lower().replace('-', ':')
-        except:
-            pass
+    def get_clients(self) -> dict:
+        """{ip: mac} de las sesiones con MAC conocida: lo que debería estar autorizado."""
+        with self.lock:
+            return {session.ip: session.mac for session in self.sessions.values() if session.mac}
         
-        return None
+    def get_mac_from_ip(self, ip_address: str) -> Optional[str]:
+        return self.neighbors.lookup(ip_address)
 
     
     def stop(self):
         self._running = False
+        self.expiry.stop()
+        if self.journal is not None:
+            # Las sesiones siguen en el diario y se restauran al arrancar
+            self._compact_journal()
+            self.journal.close()
+            return
         with self.lock:
             ips = list(self.sessions.keys())
         for ip in ips:
@@ -0,0 +1,268 @@
+import json
+import os
+import sys
+import sqlite3
+import threading
+from typing import Iterable, Iterator, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import USERS_FILE, USERS_DB, USER_BACKEND
+from log import get_logger
+
+
+log = get_logger("USERS")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SQLITE_BATCH_SIZE = 5000
+
+
+class UserStore:
+    """
+    Interfaz de almacenamiento de usuarios: {usuario: hash de contraseña}.
+    Las operaciones *_many aplican todo el lote en una única escritura.
+    """
+
+    def exists(self) -> bool:
+        raise NotImplementedError
+
+    def get(self, username: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def add_many(self, users: Iterable[Tuple[str, str]]) -> int:
+        """Inserta los usuarios que no existan. Devuelve cuántos se insertaron."""
+        raise NotImplementedError
+
+    def delete_many(self, usernames: Iterable[str]) -> int:
+        """Elimina los usuarios que existan. Devuelve cuántos se eliminaron."""
+        raise NotImplementedError
+
+    def update(self, username: str, password_hash: str) -> bool:
+        """Sustituye el hash de un usuario existente."""
+        raise NotImplementedError
+
+    def iter_users(self) -> Iterator[Tuple[str, str]]:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def add(self, username: str, password_hash: str) -> bool:
+        return self.add_many([(username, password_hash)]) == 1
+
+    def delete(self, username: str) -> bool:
+        return self.delete_many([username]) == 1
+
+    def close(self):
+        pass
+
+
+class JSONUserStore(UserStore):
+    """
+    Backend sobre data/users.json con un índice en memoria.
+
+    El índice se carga una vez y sólo se recarga si el fichero cambia (mtime,
+    inode o tamaño). Nunca se modifica in situ: los escritores construyen uno
+    nuevo y lo sustituyen, así los lectores siempre ven una instantánea
+    consistente sin tomar el lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._users = {}
+        self._stamp = None
+        self._lock = threading.Lock()
+        self._refresh()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def _refresh(self):
+        """Recarga el índice sólo si el fichero cambió."""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            self._users = self._load()
+            self._stamp = stamp
+            log.info("Usuarios cargados", backend="json", count=len(self._users))
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except:
+            return {}
+
+    def _commit(self, users: dict):
+        """Guarda y publica el nuevo índice. Requiere self._lock."""
+        # Escritura atómica: un fallo a mitad no deja el fichero truncado
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(users, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._users = users
+        self._stamp = self._file_stamp()
+
+    def get(self, username: str) -> Optional[str]:
+        self._refresh()
+        return self._users.get(username)
+
+    def add_many(self, users: Iterable[Tuple[str, str]]) -> int:
+        self._refresh()
+        with self._lock:
+            updated = dict(self._users)
+            added = 0
+            for username, password_hash in users:
+                if username not in updated:
+                    updated[username] = password_hash
+                    added += 1
+            if added:
+                self._commit(updated)
+        return added
+
+    def delete_many(self, usernames: Iterable[str]) -> int:
+        self._refresh()
+        with self._lock:
+            updated = dict(self._users)
+            removed = 0
+            for username in usernames:
+                if updated.pop(username, None) is not None:
+                    removed += 1
+            if removed:
+                self._commit(updated)
+        return removed
+
+    def update(self, username: str, password_hash: str) -> bool:
+        self._refresh()
+        with self._lock:
+            if username not in self._users:
+                return False
+            updated = dict(self._users)
+            updated[username] = password_hash
+            self._commit(updated)
+        return True
+
+    def iter_users(self) -> Iterator[Tuple[str, str]]:
+        self._refresh()
+        return iter(self._users.items())
+
+    def count(self) -> int:
+        self._refresh()
+        return len(self._users)
+
+
+class SQLiteUserStore(UserStore):
+    """
+    Backend sqlite3 en modo WAL. `username` es la clave primaria (tabla
+    WITHOUT ROWID), así que cada búsqueda es una consulta indexada y el coste
+    de login no depende del número de usuarios. Cada thread usa su propia
+    conexión.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._existed = os.path.exists(path)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                " username TEXT PRIMARY KEY,"
+                " password_hash TEXT NOT NULL"
+                ") WITHOUT ROWID"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def exists(self) -> bool:
+        return self._existed
+
+    def get(self, username: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT password_hash FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def add_many(self, users: Iterable[Tuple[str, str]]) -> int:
+        conn = self._conn()
+        before = conn.total_changes
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (username, password_hash) VALUES (?, ?)", users
+            )
+        return conn.total_changes - before
+
+    def delete_many(self, usernames: Iterable[str]) -> int:
+        conn = self._conn()
+        before = conn.total_changes
+        with conn:
+            conn.executemany("DELETE FROM users WHERE username = ?", ((u,) for u in usernames))
+        return conn.total_changes - before
+
+    def update(self, username: str, password_hash: str) -> bool:
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE users SET password_hash = ? WHERE username = ?", (password_hash, username)
+            )
+        return cursor.rowcount == 1
+
+    def iter_users(self) -> Iterator[Tuple[str, str]]:
+        cursor = self._conn().execute("SELECT username, password_hash FROM users ORDER BY username")
+        while True:
+            rows = cursor.fetchmany(SQLITE_BATCH_SIZE)
+            if not rows:
+                return
+            yield from rows
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def migrate_json_to_sqlite(json_path: str, db_path: str) -> int:
+    """Copia todos los usuarios del JSON a SQLite en una transacción."""
+    source = JSONUserStore(json_path)
+    target = SQLiteUserStore(db_path)
+    try:
+        migrated = target.add_many(source.iter_users())
+    finally:
+        target.close()
+    log.info("Usuarios migrados a SQLite", count=migrated, source=json_path, target=db_path)
+    return migrated
+
+
+def create_store(backend: str = USER_BACKEND) -> UserStore:
+    json_path = os.path.join(BASE_DIR, USERS_FILE)
+    if backend == "sqlite":
+        db_path = os.path.join(BASE_DIR, USERS_DB)
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        if not os.path.exists(db_path) and os.path.exists(json_path):
+            migrate_json_to_sqlite(json_path, db_path)
+        return SQLiteUserStore(db_path)
+    if backend != "json":
+        log.warning("Backend de usuarios desconocido, usando 'json'", backend=backend)
+    os.makedirs(os.path.dirname(json_path), exist_ok=True)
+    return JSONUserStore(json_path)
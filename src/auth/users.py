@@ -1,73 +1,69 @@
 
-import json
-import hashlib
 import os
 import sys
+from concurrent.futures import Future
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import USERS_FILE
+from auth.storage import UserStore, create_store
+from auth.passwords import PasswordVerifier, VerifierBusy, hash_password, verify_password, needs_rehash
+from log import get_logger
+
+
+log = get_logger("USERS")
 
 
 class UserManager:
     
-    def __init__(self):
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        self.users_file = os.path.join(base_dir, USERS_FILE)
-        self._ensure_file_exists()
+    def __init__(self, store: UserStore = None, verifier: PasswordVerifier = None):
+        self.store = store or create_store()
+        self.verifier = verifier or PasswordVerifier()
+        # Hash de relleno para usuarios inexistentes: mismo esquema y coste que
+        # uno real, para que el tiempo de respuesta no revele si el usuario existe
+        self._dummy_hash = hash_password(os.urandom(16).hex())
+        self._ensure_admin()
     
-    def _ensure_file_exists(self):
-        dir_path = os.path.dirname(self.users_file)
-        if dir_path and not os.path.exists(dir_path):
-            os.makedirs(dir_path, exist_ok=True)
-        
-        if not os.path.exists(self.users_file):
+    def _ensure_admin(self):
+        if not self.store.exists():
             # Crear usuario admin por defecto
-            users = {"admin": self._hash_password("admin123")}
-            self._save_users(users)
-            print("[USERS] Usuario admin creado (password: admin123)")
+            self.store.add("admin", self._hash_password("admin123"))
+            log.warning("Usuario admin creado con la contraseña por defecto", user="admin")
     
     def _hash_password(self, password: str) -> str:
-        salt = os.urandom(16).hex()
-        hash_value = hashlib.sha256((salt + password).encode()).hexdigest()
-        return f"{salt}:{hash_value}"
+        return hash_password(password)
     
-    def _verify_password(self, password: str, stored_hash: str) -> bool:
-        try:
-            salt, _ = stored_hash.split(':', 1)
-            new_hash = hashlib.sha256((salt + password).encode()).hexdigest()
-            return stored_hash == f"{salt}:{new_hash}"
-        except:
-            return False
+    def authenticate(self, username: str, password: str) -> bool:
+        """Verifica en el pool de contraseñas. Lanza VerifierBusy si está saturado."""
+        return self.authenticate_async(username, password).result()
     
-    def _load_users(self) -> dict:
-        try:
-            with open(self.users_file, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
+    def authenticate_async(self, username: str, password: str) -> Future:
+        stored_hash = self.store.get(username)
+        if stored_hash is None:
+            return self.verifier.submit(self._verify_unknown, password)
+        return self.verifier.submit(self._verify, username, password, stored_hash)
     
-    def _save_users(self, users: dict):
-        with open(self.users_file, 'w') as f:
-            json.dump(users, f, indent=2)
+    def _verify_unknown(self, password: str) -> bool:
+        verify_password(password, self._dummy_hash)
+        return False
     
-    def authenticate(self, username: str, password: str) -> bool:
-        users = self._load_users()
-        if username not in users:
+    def _verify(self, username: str, password: str, stored_hash: str) -> bool:
+        if not verify_password(password, stored_hash):
             return False
-        return self._verify_password(password, users[username])
+        if needs_rehash(stored_hash):
+            # Se actualiza en segundo plano; si el pool está lleno se reintenta en el próximo login
+            try:
+                self.verifier.submit(self._rehash, username, password)
+            except VerifierBusy:
+                pass
+        return True
+    
+    def _rehash(self, username: str, password: str):
+        if self.store.update(username, hash_password(password)):
+            log.info("Hash de contraseña actualizado", user=username)
     
     def add_user(self, username: str, password: str) -> bool:
-        users = self._load_users()
-        if username in users:
+        if not self.store.add(username, self._hash_password(password)):
             return False
-        users[username] = self._hash_password(password)
-        self._save_users(users)
-        print(f"[USERS] Usuario creado: {username}")
+        log.info("Usuario creado", user=username)
         return True
     
     def delete_user(self, username: str) -> bool:
-        users = self._load_users()
-        if username not in users:
-            return False
-        del users[username]
-        self._save_users(users)
-        return True
+        return self.store.delete(username)
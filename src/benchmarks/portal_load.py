@@ -0,0 +1,284 @@
+"""
+NetGuard - Benchmark de carga del portal HTTP sobre loopback.
+
+Levanta CaptivePortalServer (o el motor eventloop) en 127.0.0.1 dentro de un
+proceso hijo, con gestores de sesión y usuarios en memoria, y lo ataca con
+miles de clientes simulados. Cada cliente usa su propia IP de origen
+127.x.y.z, así que el portal lo ve como un dispositivo distinto.
+
+Uso:
+    python3 benchmarks/portal_load.py --engine threaded --clients 2000 --duration 15
+    python3 benchmarks/portal_load.py --engine eventloop --keepalive \\
+        --mix probe=70,login_page=10,login_post=10,status=10 --output eventloop.json
+"""
+import sys
+import os
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+import resource
+import subprocess
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth.sessions import Session
+from benchmarks.stats import percentiles
+
+
+SCENARIOS = {
+    'probe': b'GET /generate_204 HTTP/1.1\r\nHost: connectivitycheck.gstatic.com\r\n',
+    'login_page': b'GET /login HTTP/1.1\r\nHost: portal\r\n',
+    'login_post': b'POST /login HTTP/1.1\r\nHost: portal\r\n'
+                  b'Content-Type: application/x-www-form-urlencoded\r\n'
+                  b'Content-Length: 29\r\n',
+    'status': b'GET /status HTTP/1.1\r\nHost: portal\r\n',
+}
+LOGIN_BODY = b'username=bench&password=bench'
+
+DEFAULT_MIX = 'probe=60,login_page=20,login_post=10,status=10'
+
+
+class StubSessionManager:
+    """Sesiones en memoria, sin firewall ni resolución de MAC."""
+
+    def __init__(self):
+        self.sessions = {}
+
+    def is_authenticated(self, ip_address: str) -> bool:
+        return ip_address in self.sessions
+
+    def get_session(self, ip_address: str) -> Session:
+        return self.sessions.get(ip_address)
+
+    def create_session(self, ip_address: str, username: str) -> bool:
+        now = time.time()
+        self.sessions[ip_address] = Session(ip_address, username, None, now, now + 3600)
+        return True
+
+    def end_session(self, ip_address: str) -> bool:
+        return self.sessions.pop(ip_address, None) is not None
+
+
+class StubUserManager:
+
+    def authenticate(self, username: str, password: str) -> bool:
+        return username == 'bench' and password == 'bench'
+
+
+def _serve(engine: str, host: str, port: int, rate_limit: bool):
+    sys.stdout = open(os.devnull, 'w')
+    from http_server.server import create_server
+    from http_server.ratelimit import TokenBucketLimiter
+    server = create_server(StubSessionManager(), StubUserManager(), engine, host=host, port=port)
+    if not rate_limit:
+        # Los clientes simulados superan con creces la tasa de un dispositivo real
+        unlimited = float('inf')
+        server.probe_limiter.rate = server.login_limiter.rate = unlimited
+        server.probe_limiter.burst = server.login_limiter.burst = unlimited
+    signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+    server.start()
+
+
+def _proc_status(pid: int) -> dict:
+    values = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('Threads', 'VmRSS'):
+                    values[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return values
+
+
+def _client_address(index: int) -> str:
+    # 127.0.0.1 queda para el servidor; el resto de 127/8 responde en loopback
+    n = index + 2
+    return f"127.{(n >> 16) & 0xff}.{(n >> 8) & 0xff}.{n & 0xff or 1}"
+
+
+def _parse_mix(text: str) -> tuple:
+    names, weights = [], []
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"Escenario desconocido: {name} (disponibles: {', '.join(SCENARIOS)})")
+        names.append(name)
+        weights.append(float(weight or 1))
+    return names, weights
+
+
+async def _read_response(reader) -> tuple:
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head[9:12])
+    length = 0
+    close = False
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'connection' and value.strip().lower() == b'close':
+            close = True
+    if length:
+        await reader.readexactly(length)
+    return status, close
+
+
+async def _client(index: int, args, names, weights, deadline: float, results: dict):
+    local_ip = _client_address(index)
+    rng = random.Random(index)
+    reader = writer = None
+    connection_header = b'' if args.keepalive else b'Connection: close\r\n'
+
+    while time.monotonic() < deadline:
+        scenario = rng.choices(names, weights)[0]
+        request = SCENARIOS[scenario] + connection_header + b'\r\n'
+        if scenario == 'login_post':
+            request += LOGIN_BODY
+
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(
+                    args.host, args.port, local_addr=(local_ip, 0))
+            writer.write(request)
+            status, close = await _read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            results['errors'][type(e).__name__] = results['errors'].get(type(e).__name__, 0) + 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.01)
+            continue
+
+        results['latency'][scenario].append(time.perf_counter() - start)
+        results['status'][status] = results['status'].get(status, 0) + 1
+
+        if close or not args.keepalive:
+            writer.close()
+            reader = writer = None
+        if args.think:
+            await asyncio.sleep(rng.uniform(0, args.think))
+
+    if writer is not None:
+        writer.close()
+
+
+async def _run_clients(args, names, weights, server_pid: int) -> dict:
+    results = {
+        'latency': {name: [] for name in names},
+        'status': {},
+        'errors': {},
+        'threads': [],
+        'rss_kb': [],
+    }
+
+    async def sample_server():
+        while True:
+            status = _proc_status(server_pid)
+            if status:
+                results['threads'].append(status.get('Threads', 0))
+                results['rss_kb'].append(status.get('VmRSS', 0))
+            await asyncio.sleep(0.5)
+
+    sampler = asyncio.create_task(sample_server())
+    deadline = time.monotonic() + args.duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _client(i, args, names, weights, deadline, results) for i in range(args.clients)
+    ))
+    results['elapsed'] = time.perf_counter() - started
+    sampler.cancel()
+    return results
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        return ''
+
+
+def _raise_fd_limit(needed: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = min(hard, max(soft, needed))
+    if target > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de carga del portal NetGuard')
+    parser.add_argument('--engine', default='threaded', help='threaded | eventloop')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--clients', type=int, default=1000, help='Clientes simultáneos')
+    parser.add_argument('--duration', type=float, default=10.0, help='Segundos de carga')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Pesos por escenario')
+    parser.add_argument('--keepalive', action='store_true', help='Reutilizar conexiones')
+    parser.add_argument('--think', type=float, default=0.0, help='Pausa máx. entre peticiones (s)')
+    parser.add_argument('--rate-limit', action='store_true', help='Mantener los límites de tasa por cliente')
+    parser.add_argument('--output', help='Fichero JSON de resultados')
+    args = parser.parse_args()
+
+    names, weights = _parse_mix(args.mix)
+    _raise_fd_limit(args.clients * 2 + 256)
+
+    server = multiprocessing.Process(target=_serve, args=(args.engine, args.host, args.port, args.rate_limit), daemon=True)
+    server.start()
+    time.sleep(1.0)
+    if not server.is_alive():
+        raise SystemExit("El servidor no arrancó")
+
+    try:
+        results = asyncio.run(_run_clients(args, names, weights, server.pid))
+    finally:
+        server.terminate()
+        server.join(timeout=5)
+
+    all_latencies = [x for samples in results['latency'].values() for x in samples]
+    total = len(all_latencies)
+    report = {
+        'revision': _git_revision(),
+        'engine': args.engine,
+        'clients': args.clients,
+        'duration_s': round(results['elapsed'], 3),
+        'keepalive': args.keepalive,
+        'rate_limit': args.rate_limit,
+        'mix': dict(zip(names, weights)),
+        'requests': total,
+        'throughput_rps': round(total / results['elapsed'], 1) if results['elapsed'] else 0,
+        'latency': percentiles(all_latencies, scale=1000),
+        'scenarios': {name: percentiles(samples, scale=1000) for name, samples in results['latency'].items()},
+        'status_codes': {str(k): v for k, v in sorted(results['status'].items())},
+        'errors': results['errors'],
+        'server_threads_max': max(results['threads'], default=0),
+        'server_rss_max_mb': round(max(results['rss_kb'], default=0) / 1024, 1),
+    }
+
+    print(f"Motor: {report['engine']}  clientes: {args.clients}  duración: {report['duration_s']}s")
+    print(f"Peticiones: {total}  throughput: {report['throughput_rps']} req/s  errores: {sum(results['errors'].values())}")
+    latency = report['latency']
+    if latency:
+        print(f"Latencia  p50 {latency['p50_ms']} ms  p90 {latency['p90_ms']} ms  "
+              f"p99 {latency['p99_ms']} ms  max {latency['max_ms']} ms")
+    for name, stats in report['scenarios'].items():
+        if stats:
+            print(f"  {name:<11} n={stats['count']:<8} p50 {stats['p50_ms']} ms  p99 {stats['p99_ms']} ms")
+    print(f"Threads servidor (máx): {report['server_threads_max']}  RSS (máx): {report['server_rss_max_mb']} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
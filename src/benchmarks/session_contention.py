@@ -0,0 +1,183 @@
+"""
+NetGuard - Benchmark de contención de SessionManager.
+
+Mide la latencia de is_authenticated/get_session desde varios threads
+lectores mientras otros threads hacen login/logout continuamente y un
+barrido de suplantación de MAC se ejecuta en bucle. El firewall y la tabla
+ARP son falsos, y cada llamada al firewall dura --firewall-delay segundos;
+el diario de sesiones se escribe en un directorio temporal.
+
+Con --locked, las lecturas toman SessionManager.lock, como antes del camino
+de lectura sin lock, para comparar ambos resultados.
+
+Uso:
+    python3 benchmarks/session_contention.py --sessions 5000 --readers 8 --writers 4
+    python3 benchmarks/session_contention.py --locked --output locked.json
+"""
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log import setup_logging
+setup_logging("WARNING")   # un registro por login/logout distorsionaría la medida
+
+from auth.sessions import SessionManager
+from auth.session_store import SessionJournal
+from gateway.neighbors import NeighborTable
+from benchmarks.stats import percentiles
+
+
+class FakeFirewall:
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def authorize_ip(self, ip_address: str, mac_address: str = None) -> bool:
+        if self.delay:
+            time.sleep(self.delay)
+        return True
+
+    def revoke_ip(self, ip_address: str, mac_address: str = None) -> bool:
+        if self.delay:
+            time.sleep(self.delay)
+        return True
+
+    def revoke_async(self, ip_address: str, mac_address: str = None) -> Future:
+        future = Future()
+        future.set_result(self.revoke_ip(ip_address, mac_address))
+        return future
+
+    def authorize_many(self, clients) -> list:
+        return [ip for ip, _ in clients]
+
+
+class FakeNeighborTable(NeighborTable):
+    """Tabla ARP fija: cada IP con una MAC derivada de ella."""
+
+    def __init__(self, ips: list):
+        super().__init__()
+        self._static = {ip: _mac_for(ip) for ip in ips}
+
+    def snapshot(self, max_age: float = None) -> dict:
+        return self._static
+
+
+def _ip(index: int) -> str:
+    return f"10.{(index >> 16) & 0xff}.{(index >> 8) & 0xff}.{index & 0xff}"
+
+
+def _mac_for(ip: str) -> str:
+    return "02:00:" + ":".join(f"{int(part):02x}" for part in ip.split('.'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de contención de sesiones')
+    parser.add_argument('--sessions', type=int, default=5000, help='Sesiones iniciales')
+    parser.add_argument('--readers', type=int, default=8, help='Threads lectores')
+    parser.add_argument('--writers', type=int, default=4, help='Threads de login/logout')
+    parser.add_argument('--duration', type=float, default=5.0, help='Segundos de medida')
+    parser.add_argument('--firewall-delay', type=float, default=0.002, help='Duración de cada llamada al firewall (s)')
+    parser.add_argument('--think', type=float, default=0.0001, help='Pausa entre lecturas (s), 0 = bucle continuo')
+    parser.add_argument('--locked', action='store_true', help='Leer tomando el lock (referencia)')
+    parser.add_argument('--output', help='Fichero JSON de resultados')
+    args = parser.parse_args()
+
+    ips = [_ip(i) for i in range(args.sessions * 2)]
+    journal_dir = tempfile.TemporaryDirectory()
+    journal = SessionJournal(os.path.join(journal_dir.name, 'sessions.journal'))
+    manager = SessionManager(FakeFirewall(args.firewall_delay), FakeNeighborTable(ips), journal)
+    for ip in ips[:args.sessions]:
+        manager.create_session(ip, f"user{ip}")
+
+    if args.locked:
+        def is_authenticated(ip):
+            with manager.lock:
+                return ip in manager.sessions
+
+        def get_session(ip):
+            with manager.lock:
+                return manager.sessions.get(ip)
+    else:
+        is_authenticated = manager.is_authenticated
+        get_session = manager.get_session
+
+    stop = threading.Event()
+    read_latencies = [[] for _ in range(args.readers)]
+    churn = [0] * args.writers
+    sweeps = [0]
+
+    def reader(slot: int):
+        rng = random.Random(slot)
+        samples = read_latencies[slot]
+        clock = time.perf_counter_ns
+        while not stop.is_set():
+            ip = rng.choice(ips)
+            start = clock()
+            if is_authenticated(ip):
+                get_session(ip)
+            samples.append(clock() - start)
+            if args.think:
+                time.sleep(args.think)
+
+    def writer(slot: int):
+        rng = random.Random(1000 + slot)
+        while not stop.is_set():
+            ip = rng.choice(ips)
+            if not manager.end_session(ip):
+                manager.create_session(ip, f"user{ip}")
+            churn[slot] += 1
+
+    def sweeper():
+        while not stop.is_set():
+            manager._check_mac_spoofing()
+            sweeps[0] += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    threads.append(threading.Thread(target=sweeper))
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    manager.stop()
+    journal_dir.cleanup()
+
+    reads = [x for samples in read_latencies for x in samples]
+    report = {
+        'mode': 'locked' if args.locked else 'lock-free',
+        'sessions': args.sessions,
+        'readers': args.readers,
+        'writers': args.writers,
+        'duration_s': args.duration,
+        'firewall_delay_s': args.firewall_delay,
+        'think_s': args.think,
+        'reads_per_second': round(len(reads) / args.duration, 1),
+        'read_latency': percentiles(reads, scale=1 / 1000, unit='us', points=(50, 99, 99.9), digits=2),
+        'writes_per_second': round(sum(churn) / args.duration, 1),
+        'spoof_sweeps': sweeps[0],
+    }
+
+    latency = report['read_latency']
+    print(f"Modo: {report['mode']}  sesiones: {args.sessions}  lectores: {args.readers}  escritores: {args.writers}")
+    print(f"Lecturas: {report['reads_per_second']}/s  p50 {latency['p50_us']} us  p99 {latency['p99_us']} us  "
+          f"p99.9 {latency['p999_us']} us  max {latency['max_us']} us")
+    print(f"Login/logout: {report['writes_per_second']}/s  barridos de MAC: {report['spoof_sweeps']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+NetGuard - Utilidades comunes de los benchmarks.
+"""
+
+
+def percentiles(samples: list, scale: float = 1.0, unit: str = 'ms',
+                points: tuple = (50, 90, 99, 99.9), digits: int = 3) -> dict:
+    """
+    Resumen de una lista de latencias: número de muestras, percentiles y
+    máximo. Cada valor se multiplica por `scale` y se redondea a `digits`
+    decimales; las claves llevan la unidad (p50_ms, p999_ms, max_ms...).
+    """
+    if not samples:
+        return {}
+    samples = sorted(samples)
+    last = len(samples) - 1
+
+    def pct(p):
+        return round(samples[min(last, int(p / 100 * len(samples)))] * scale, digits)
+
+    summary = {'count': len(samples)}
+    for p in points:
+        summary[f"p{str(p).replace('.', '')}_{unit}"] = pct(p)
+    summary[f"max_{unit}"] = round(samples[-1] * scale, digits)
+    return summary
@@ -15,6 +15,14 @@ DHCP_START = "192.168.100.100"
 DHCP_END = "192.168.100.200"
 
 EXTERNAL_DNS = "8.8.8.8"
+
+FIREWALL_BACKEND = "iptables"      # "iptables" (reglas por cliente), "ipset" o "nftables" (coste por paquete constante)
+
+FIREWALL_BATCH_WINDOW = 0.02       # Segundos que se agrupan los cambios del firewall en un lote
+
+FIREWALL_BATCH_SIZE = 256          # Máximo de clientes por lote
+
+FIREWALL_RECONCILE_INTERVAL = 300  # Segundos entre comparaciones del firewall real con las sesiones (0 = nunca)
 # WiFi Hotspot Configuration
 
 WIFI_SSID = "NetGuard"             # Nombre de la red WiFi
@@ -30,17 +38,104 @@ WIFI_MODE = "hotspot"              # Modo: "hotspot" (AP) o "client"
 
 BUFFER_SIZE = 4096
 
+MAX_HEADER_SIZE = 8192             # Límite de línea de petición + cabeceras
+
+MAX_BODY_SIZE = 65536              # Límite de cuerpo (Content-Length)
+
 SOCKET_TIMEOUT = 30
 
+HTTP_ENGINE = "threaded"           # "threaded" (pool fijo de HTTP_WORKERS) o "eventloop" (selectors)
+
+EVENT_LOOP_HANDLER_THREADS = 8     # Threads para handlers bloqueantes en modo eventloop
+
+EVENT_LOOP_MAX_PENDING = 256       # Peticiones esperando un handler antes de rechazar (modo eventloop)
+
+LISTEN_BACKLOG = 1024
+
+HTTP_WORKERS = 32                  # Tamaño fijo del pool de workers (modo threaded)
+
+HTTP_QUEUE_SIZE = 256              # Conexiones aceptadas en espera de un worker
+
+HTTP_OVERLOAD_RESPONSE = "503"     # Respuesta con la cola llena: "503" o "302" (redirige a /login)
+
+KEEPALIVE_TIMEOUT = 5              # Segundos de inactividad antes de cerrar una conexión persistente
+
+KEEPALIVE_MAX_REQUESTS = 100       # Peticiones máximas por conexión (0 = sin keep-alive)
+
+HTTP_STATS_INTERVAL = 60           # Segundos entre líneas de estadísticas del servidor en el log (0 = nunca)
+
+# Límites de tasa por cliente: (tokens por segundo, ráfaga máxima)
+
+RATE_LIMIT_PROBE = (5, 20)         # Sondas de conectividad
+
+RATE_LIMIT_LOGIN = (0.2, 5)        # Intentos de login (uno cada 5 s tras la ráfaga)
+
+RATE_LIMIT_IDLE_TTL = 300          # Segundos sin actividad antes de olvidar a un cliente
+
+RATE_LIMIT_MAX_CLIENTS = 50000     # Máximo de clientes con cubeta en memoria
+
 
 # Archivos
 
 USERS_FILE = "data/users.json"
 
+USERS_DB = "data/users.db"
+
+USER_BACKEND = "json"              # "json" o "sqlite" (migra users.json automáticamente la primera vez)
+
+TEMPLATE_CHECK_INTERVAL = 2        # Segundos entre comprobaciones de mtime de las plantillas
+
+
+# Contraseñas
+
+PASSWORD_SCHEME = "pbkdf2_sha256"  # "pbkdf2_sha256" o "scrypt"; los hashes antiguos se actualizan al hacer login
+
+PBKDF2_ITERATIONS = 200000
+
+SCRYPT_N = 2 ** 14
+
+SCRYPT_R = 8
+
+SCRYPT_P = 1
+
+PASSWORD_WORKERS = 4               # Threads dedicados a verificar contraseñas
+
+PASSWORD_QUEUE_SIZE = 6            # Verificaciones en vuelo antes de responder 503 (menos que HTTP_WORKERS y EVENT_LOOP_HANDLER_THREADS)
+
+# Logging
+
+LOG_LEVEL = "INFO"                 # DEBUG, INFO, WARNING, ERROR
+
+LOG_QUEUE_SIZE = 10000             # Registros pendientes antes de descartar
+
+LOG_SAMPLE_RATES = {               # Eventos de alto volumen: se registra 1 de cada N
+    "request": 100,
+    "probe": 100,
+    "redirect": 100,
+}
+
 # Sesiones
 
 SESSION_TIMEOUT = 3600  # 1 hora
 
+SESSION_CHECK_INTERVAL = 30        # Segundos entre comprobaciones de suplantación de MAC
+
+NEIGHBOR_CACHE_TTL = 2             # Vigencia (s) de la instantánea de la tabla ARP
+
+MAX_SESSIONS_PER_USER = 0          # Dispositivos simultáneos por usuario (0 = sin límite)
+
+SESSION_LIMIT_POLICY = "oldest"    # Al superar el límite: "oldest" (cierra la más antigua) o "reject"
+
+ACCOUNTING_INTERVAL = 60           # Segundos entre lecturas de contadores de tráfico
+
+SESSION_QUOTA_BYTES = 0            # Tráfico máximo por sesión, subida + bajada (0 = sin límite)
+
+SESSION_PERSIST = True             # Conservar las sesiones entre reinicios
+
+SESSION_JOURNAL = "data/sessions.journal"
+
+SESSION_JOURNAL_FSYNC = False      # fsync tras cada cambio (más lento, sobrevive a cortes de luz)
+
 
 # URLs de detección de portal cautivo 
 
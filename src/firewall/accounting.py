@@ -0,0 +1,83 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import ACCOUNTING_INTERVAL, SESSION_QUOTA_BYTES
+from log import get_logger
+
+
+log = get_logger("ACCOUNTING")
+
+
+def format_bytes(count: int) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if count < 1024 or unit == 'GB':
+            return f"{count:.0f} {unit}" if unit == 'B' else f"{count:.1f} {unit}"
+        count /= 1024
+
+
+def format_usage(total_bytes: int, quota: int = SESSION_QUOTA_BYTES) -> str:
+    if quota:
+        return f"{format_bytes(total_bytes)} de {format_bytes(quota)}"
+    return format_bytes(total_bytes)
+
+
+class TrafficCollector:
+    """
+    Contabilidad de tráfico por sesión.
+
+    Cada `interval` segundos lee los contadores de todas las IP autorizadas
+    con una sola llamada (FirewallManager.read_counters), suma a cada sesión
+    lo consumido desde la lectura anterior y revoca las que superan la cuota.
+    """
+
+    def __init__(self, firewall, session_manager, interval: float = ACCOUNTING_INTERVAL,
+                 quota: int = SESSION_QUOTA_BYTES):
+        self.firewall = firewall
+        self.session_manager = session_manager
+        self.interval = interval
+        self.quota = quota
+        # Última lectura por IP: los contadores de iptables son acumulados
+        self._last = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='accounting', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.collect()
+            except Exception as e:
+                log.error("Error leyendo contadores", error=e)
+
+    def collect(self) -> int:
+        """Una pasada. Devuelve cuántas sesiones se revocaron por cuota."""
+        counters = self.firewall.read_counters()
+        deltas = {}
+        for ip, current in counters.items():
+            last = self._last.get(ip)
+            if last is None or any(c < l for c, l in zip(current, last)):
+                # Regla nueva o recreada (login, traslado, reinicio): el contador empezó de cero
+                deltas[ip] = current
+            else:
+                deltas[ip] = tuple(c - l for c, l in zip(current, last))
+        self._last = counters
+
+        updated = self.session_manager.add_usage(deltas)
+        if not self.quota:
+            return 0
+
+        revoked = 0
+        for session in updated:
+            if session.total_bytes >= self.quota and self.session_manager.end_session(session.ip):
+                revoked += 1
+                log.warning("Cuota de tráfico agotada", user=session.username, ip=session.ip,
+                            bytes=session.total_bytes, quota=self.quota)
+        return revoked
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,650 @@
+"""
+Backends del firewall.
+
+FirewallManager lleva la cuenta de qué clientes están autorizados y delega en
+un backend la traducción a reglas. Cada operación (o grupo de operaciones)
+se aplica como una única transacción, y los comandos pasan por un
+CommandRunner que se puede sustituir por RecordingRunner para probar el
+backend sin tocar el sistema.
+"""
+import re
+import json
+import subprocess
+import sys
+import os
+import time
+from collections import namedtuple
+from typing import Iterable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import LAN_INTERFACE, WAN_INTERFACE, PORTAL_IP, PORTAL_PORT, EXTERNAL_DNS, FIREWALL_BACKEND
+from log import get_logger
+
+
+log = get_logger("FIREWALL")
+
+# Borrar una regla o un elemento que ya no existe deja el estado pedido: no es un fallo
+_ALREADY_GONE = re.compile(r'does a matching rule exist|No such file or directory')
+
+
+def _removed(result) -> bool:
+    return result.returncode == 0 or bool(_ALREADY_GONE.search(result.stderr or ''))
+
+CommandResult = namedtuple('CommandResult', 'returncode stdout stderr')
+
+Client = Tuple[str, Optional[str]]   # (ip, mac)
+
+
+class CommandRunner:
+    """Ejecuta comandos sin shell. `input` se pasa por stdin."""
+
+    def run(self, argv: List[str], input: str = None, timeout: float = 30) -> CommandResult:
+        try:
+            result = subprocess.run(argv, input=input, capture_output=True, text=True, timeout=timeout)
+            return CommandResult(result.returncode, result.stdout, result.stderr)
+        except Exception as e:
+            return CommandResult(1, '', str(e))
+
+
+class RecordingRunner(CommandRunner):
+    """
+    Runner falso: guarda cada llamada en `calls` como (argv, input) y
+    devuelve éxito sin ejecutar nada. `outputs` fija la salida por programa
+    ({'iptables-save': '...'}), `failing` los programas que deben fallar (o
+    un dict programa -> stderr) y `delay` simula la duración de cada proceso.
+    """
+
+    def __init__(self, outputs: dict = None, failing: Iterable[str] = (), delay: float = 0.0):
+        self.calls = []
+        self.outputs = dict(outputs or {})
+        self.failing = dict(failing) if isinstance(failing, dict) else dict.fromkeys(failing, 'fallo simulado')
+        self.delay = delay
+
+    def run(self, argv: List[str], input: str = None, timeout: float = 30) -> CommandResult:
+        self.calls.append((list(argv), input))
+        if self.delay:
+            time.sleep(self.delay)
+        if argv[0] in self.failing:
+            return CommandResult(1, '', self.failing[argv[0]])
+        return CommandResult(0, self.outputs.get(argv[0], ''), '')
+
+    def commands(self) -> List[str]:
+        return [' '.join(argv) for argv, _ in self.calls]
+
+    def reset(self):
+        self.calls.clear()
+
+
+class FirewallBackend:
+    """
+    Interfaz de backend. `apply()` aplica en una transacción todas las altas y
+    bajas que recibe; authorize() y revoke() son atajos de una sola lista.
+    """
+
+    name = None
+
+    def __init__(self, runner: CommandRunner = None):
+        self.runner = runner or CommandRunner()
+
+    def initialize(self) -> bool:
+        raise NotImplementedError
+
+    def apply(self, authorize: List[Client] = (), revoke: List[Client] = ()) -> bool:
+        raise NotImplementedError
+
+    def authorize(self, clients: List[Client]) -> bool:
+        return self.apply(authorize=clients)
+
+    def revoke(self, clients: List[Client]) -> bool:
+        return self.apply(revoke=clients)
+
+    def read_counters(self) -> dict:
+        """{ip: (bytes_subida, bytes_bajada, paquetes)} de los clientes autorizados."""
+        return {}
+
+    def read_state(self) -> Optional['FirewallState']:
+        """Reglas por cliente instaladas realmente. None si el backend no lo soporta."""
+        return None
+
+    def repair(self, state: 'FirewallState', desired: dict, keep: Iterable[str] = ()) -> Tuple[int, int]:
+        """Corrige `state` para que coincida con `desired`. Devuelve (añadidas, borradas)."""
+        return 0, 0
+
+    def cleanup(self):
+        raise NotImplementedError
+
+    def _enable_forwarding(self):
+        self.runner.run(['sysctl', '-w', 'net.ipv4.ip_forward=1'])
+
+    def _drop_connections(self, clients: List[Client]):
+        # Corta las conexiones ya establecidas, que la regla ESTABLISHED seguiría dejando pasar
+        for ip, _ in clients:
+            self.runner.run(['conntrack', '-D', '-s', ip])
+            self.runner.run(['conntrack', '-D', '-d', ip])
+
+
+# Línea de `iptables-save -c`: "[paquetes:bytes] -A CADENA especificación"
+_COUNTER_LINE = re.compile(r'^\[(\d+):(\d+)\] -A FORWARD (.*)$')
+
+
+class FirewallState:
+    """
+    Estado real leído de una sola vez. `rules` son las reglas por cliente
+    como (clave, tabla, línea), `clients` las IP con regla ACCEPT y su MAC,
+    y `forward_rules` la longitud de la cadena FORWARD.
+    """
+
+    __slots__ = ('rules', 'clients', 'forward_rules')
+
+    def __init__(self, rules: list, clients: dict, forward_rules: int):
+        self.rules = rules
+        self.clients = clients
+        self.forward_rules = forward_rules
+
+
+def _rule_key(table: str, spec: List[str]) -> Optional[tuple]:
+    """
+    Clave de una regla por cliente, independiente del orden en que
+    iptables-save reescribe las opciones:
+      ('accept', ip, mac)  ('download', ip)  ('nat', mac, puerto)  ('drop', mac)
+    None para las reglas base.
+    """
+    options = {}
+    for i, token in enumerate(spec):
+        if token.startswith('-') and i + 1 < len(spec) and not spec[i + 1].startswith('-'):
+            options[token] = spec[i + 1]
+    chain = options.get('-A') or options.get('-I')
+    mac = options.get('--mac-source', '').lower()
+    target = options.get('-j')
+
+    if table == 'filter' and chain == 'FORWARD':
+        if '-s' in options and mac and target == 'ACCEPT':
+            return ('accept', options['-s'].split('/')[0], mac)
+        if set(options) - {'-A', '-I'} == {'-d'}:
+            return ('download', options['-d'].split('/')[0])
+        if mac and target == 'DROP':
+            # Versiones anteriores insertaban un DROP por MAC en cada logout y no lo borraban
+            return ('drop', mac)
+    elif table == 'nat' and chain == 'PREROUTING' and mac:
+        return ('nat', mac, options.get('--dport'))
+    return None
+
+
+def restore_payload(tables: dict) -> str:
+    """Texto para iptables-restore: {tabla: [líneas]} -> bloques *tabla ... COMMIT."""
+    return ''.join(
+        f"*{table}\n" + ''.join(f"{line}\n" for line in lines) + "COMMIT\n"
+        for table, lines in tables.items() if lines
+    )
+
+
+class IptablesBackend(FirewallBackend):
+    """
+    Reglas iptables por cliente aplicadas con `iptables-restore --noflush`:
+    un proceso y un único commit del ruleset por lote, en lugar de un
+    `iptables` por regla. Si la transacción falla (p. ej. al borrar una regla
+    que ya no existe) se repite regla a regla, ignorando los fallos
+    individuales como hacía la versión anterior.
+    """
+
+    name = "iptables"
+
+    def base_rules(self) -> dict:
+        return {
+            "filter": [
+                ":INPUT ACCEPT [0:0]",
+                ":FORWARD DROP [0:0]",     # Bloquear reenvío por defecto
+                ":OUTPUT ACCEPT [0:0]",
+                # Permitir conexiones establecidas
+                "-A FORWARD -m state --state ESTABLISHED,RELATED -j ACCEPT",
+                # Permitir acceso al portal y DNS
+                f"-A INPUT -i {LAN_INTERFACE} -p tcp --dport {PORTAL_PORT} -j ACCEPT",
+                f"-A INPUT -i {LAN_INTERFACE} -p udp --dport 53 -j ACCEPT",
+            ],
+            "nat": [
+                ":PREROUTING ACCEPT [0:0]",
+                ":INPUT ACCEPT [0:0]",
+                ":OUTPUT ACCEPT [0:0]",
+                ":POSTROUTING ACCEPT [0:0]",
+                # Redirigir HTTP al portal cautivo
+                f"-A PREROUTING -i {LAN_INTERFACE} -p tcp --dport 80 -j DNAT --to-destination {PORTAL_IP}:{PORTAL_PORT}",
+                # NAT para salida a Internet
+                f"-A POSTROUTING -o {WAN_INTERFACE} -j MASQUERADE",
+            ],
+        }
+
+    def initialize(self) -> bool:
+        # Sin --noflush: sustituye las tablas filter y nat enteras de forma atómica
+        result = self.runner.run(['iptables-restore'], input=restore_payload(self.base_rules()))
+        if result.returncode != 0:
+            log.error("Error cargando las reglas base", error=result.stderr.strip())
+            return False
+        self._enable_forwarding()
+        return True
+
+    def authorize_rules(self, ip: str, mac: str) -> List[Tuple[str, str]]:
+        """Reglas (tabla, especificación) que autorizan ip+mac. La primera es la de FORWARD."""
+        return [
+            ("filter", f"-I FORWARD -s {ip} -m mac --mac-source {mac} -j ACCEPT"),
+            # Sin objetivo: sólo cuenta el tráfico de bajada (va antes de la regla ESTABLISHED)
+            ("filter", f"-I FORWARD -d {ip}"),
+            ("nat", f"-I PREROUTING 1 -i {LAN_INTERFACE} -m mac --mac-source {mac} -p udp --dport 53 -j DNAT --to-destination {EXTERNAL_DNS}:53"),
+            ("nat", f"-I PREROUTING 1 -i {LAN_INTERFACE} -m mac --mac-source {mac} -p tcp --dport 80 -j ACCEPT"),
+            ("nat", f"-I PREROUTING 1 -i {LAN_INTERFACE} -m mac --mac-source {mac} -p tcp --dport 443 -j ACCEPT"),
+        ]
+
+    def revoke_rules(self, ip: str, mac: Optional[str]) -> List[Tuple[str, str]]:
+        rules = []
+        if mac:
+            rules += [
+                ("filter", f"-D FORWARD -s {ip} -m mac --mac-source {mac} -j ACCEPT"),
+                ("nat", f"-D PREROUTING -i {LAN_INTERFACE} -m mac --mac-source {mac} -p udp --dport 53 -j DNAT --to-destination {EXTERNAL_DNS}:53"),
+                ("nat", f"-D PREROUTING -i {LAN_INTERFACE} -m mac --mac-source {mac} -p tcp --dport 80 -j ACCEPT"),
+                ("nat", f"-D PREROUTING -i {LAN_INTERFACE} -m mac --mac-source {mac} -p tcp --dport 443 -j ACCEPT"),
+            ]
+        rules.append(("filter", f"-D FORWARD -d {ip}"))
+        return rules
+
+    def apply(self, authorize: List[Client] = (), revoke: List[Client] = ()) -> bool:
+        rules = []
+        for ip, mac in revoke:
+            rules += self.revoke_rules(ip, mac)
+        for ip, mac in authorize:
+            rules += self.authorize_rules(ip, mac)
+        if not rules:
+            return True
+
+        tables = {"filter": [], "nat": []}
+        for table, rule in rules:
+            tables[table].append(rule)
+        result = self.runner.run(['iptables-restore', '--noflush'], input=restore_payload(tables))
+        if result.returncode != 0:
+            log.warning("Fallo en iptables-restore, aplicando regla a regla",
+                        authorize=len(authorize), revoke=len(revoke), error=result.stderr.strip())
+            if not self._apply_one_by_one(authorize, revoke):
+                return False
+
+        if revoke:
+            self._drop_connections(revoke)
+        return True
+
+    def _apply_one_by_one(self, authorize: List[Client], revoke: List[Client]) -> bool:
+        ok = True
+        for ip, mac in revoke:
+            results = [self.runner.run(['iptables', '-t', table] + rule.split())
+                       for table, rule in self.revoke_rules(ip, mac)]
+            if not all(_removed(result) for result in results):
+                log.error("No se pudo revocar regla", ip=ip)
+                ok = False
+        for ip, mac in authorize:
+            (table, forward), *other_rules = self.authorize_rules(ip, mac)
+            if self.runner.run(['iptables', '-t', table] + forward.split()).returncode != 0:
+                log.error("No se pudo crear regla", ip=ip)
+                ok = False
+                continue
+            for table, rule in other_rules:
+                self.runner.run(['iptables', '-t', table] + rule.split())
+        return ok
+
+    def read_counters(self) -> dict:
+        result = self.runner.run(['iptables-save', '-c', '-t', 'filter'], timeout=10)
+        if result.returncode != 0:
+            log.error("No se pudieron leer los contadores", error=result.stderr.strip())
+            return {}
+
+        up, down, packets = {}, {}, {}
+        for line in result.stdout.splitlines():
+            match = _COUNTER_LINE.match(line)
+            if match is None:
+                continue
+            pkts, nbytes, spec = int(match.group(1)), int(match.group(2)), match.group(3).split()
+            if spec[0] == '-s' and '--mac-source' in spec and spec[-1] == 'ACCEPT':
+                ip, totals = spec[1].split('/')[0], up
+            elif spec[0] == '-d' and len(spec) == 2:
+                ip, totals = spec[1].split('/')[0], down
+            else:
+                continue
+            totals[ip] = totals.get(ip, 0) + nbytes
+            packets[ip] = packets.get(ip, 0) + pkts
+        return {ip: (up.get(ip, 0), down.get(ip, 0), packets[ip]) for ip in packets}
+
+    def read_state(self) -> Optional[FirewallState]:
+        # Sin -t: filter y nat en la misma lectura
+        result = self.runner.run(['iptables-save'], timeout=10)
+        if result.returncode != 0:
+            log.error("No se pudo leer el ruleset", error=result.stderr.strip())
+            return None
+
+        rules, clients, forward_rules = [], {}, 0
+        table = None
+        for line in result.stdout.splitlines():
+            if line.startswith('*'):
+                table = line[1:].strip()
+                continue
+            if not line.startswith('-A '):
+                continue
+            spec = line.split()
+            if table == 'filter' and spec[1] == 'FORWARD':
+                forward_rules += 1
+            key = _rule_key(table, spec)
+            if key is None:
+                continue
+            rules.append((key, table, line))
+            if key[0] == 'accept':
+                clients.setdefault(key[1], key[2])
+        return FirewallState(rules, clients, forward_rules)
+
+    def repair(self, state: FirewallState, desired: dict, keep: Iterable[str] = ()) -> Tuple[int, int]:
+        """
+        Deja exactamente un juego de reglas por cada cliente de `desired`
+        ({ip: mac}) en una transacción: borra duplicadas, huérfanas y restos
+        de versiones anteriores, y añade las que falten. Las reglas de las IP
+        de `keep` (cambios aún en curso) no se tocan.
+        """
+        wanted = {}
+        for ip, mac in desired.items():
+            for table, rule in self.authorize_rules(ip, mac):
+                wanted[_rule_key(table, rule.split())] = (table, rule)
+        keep = set(keep)
+        keep |= {state.clients[ip] for ip in keep if ip in state.clients}
+
+        seen = set()
+        remove = []
+        for key, table, line in state.rules:
+            if key in wanted and key not in seen:
+                seen.add(key)
+            elif key[0] == 'drop' or key[1] not in keep:
+                # La línea de iptables-save sirve tal cual para borrar la regla
+                remove.append((table, '-D' + line[2:]))
+        add = [rule for key, rule in wanted.items() if key not in seen]
+        if not remove and not add:
+            return 0, 0
+
+        tables = {"filter": [], "nat": []}
+        for table, rule in remove + add:
+            tables[table].append(rule)
+        result = self.runner.run(['iptables-restore', '--noflush'], input=restore_payload(tables))
+        if result.returncode != 0:
+            log.warning("Fallo en iptables-restore, corrigiendo regla a regla",
+                        add=len(add), remove=len(remove), error=result.stderr.strip())
+            for table, rule in remove + add:
+                self.runner.run(['iptables', '-t', table] + rule.split())
+
+        leaked = [(key[1], key[2]) for key, _, _ in state.rules
+                  if key[0] == 'accept' and key[1] not in desired and key[1] not in keep]
+        if leaked:
+            self._drop_connections(leaked)
+        return len(add), len(remove)
+
+    def cleanup(self):
+        self.runner.run(['iptables-restore'], input=restore_payload({
+            "filter": [":INPUT ACCEPT [0:0]", ":FORWARD ACCEPT [0:0]", ":OUTPUT ACCEPT [0:0]"],
+            "nat": [":PREROUTING ACCEPT [0:0]", ":INPUT ACCEPT [0:0]",
+                    ":OUTPUT ACCEPT [0:0]", ":POSTROUTING ACCEPT [0:0]"],
+        }))
+
+
+class IpsetBackend(IptablesBackend):
+    """
+    Autorización con ipset: las cadenas tienen un puñado fijo de reglas que
+    consultan dos sets, y el coste por paquete no depende del número de
+    clientes.
+
+      netguard_clients   hash:ip,mac  pares autorizados; cuenta la subida
+      netguard_download  hash:ip      mismas IP; cuenta la bajada
+
+    Login/logout es una sola llamada a `ipset restore` con líneas add/del, y
+    el arranque o la restauración cargan todos los clientes en esa misma
+    llamada. Las reglas de iptables sólo se tocan en initialize().
+    """
+
+    name = "ipset"
+
+    CLIENTS_SET = "netguard_clients"
+    DOWNLOAD_SET = "netguard_download"
+
+    def base_rules(self) -> dict:
+        tables = super().base_rules()
+        clients = f"-m set --match-set {self.CLIENTS_SET} src,src"
+        # Antes de la regla ESTABLISHED, para que los sets cuenten todo el tráfico
+        tables["filter"][3:3] = [
+            f"-A FORWARD {clients} -j ACCEPT",
+            f"-A FORWARD -m set --match-set {self.DOWNLOAD_SET} dst",
+        ]
+        # Antes de la redirección al portal
+        tables["nat"][4:4] = [
+            f"-A PREROUTING -i {LAN_INTERFACE} -p udp --dport 53 {clients} -j DNAT --to-destination {EXTERNAL_DNS}:53",
+            f"-A PREROUTING -i {LAN_INTERFACE} -p tcp --dport 80 {clients} -j ACCEPT",
+            f"-A PREROUTING -i {LAN_INTERFACE} -p tcp --dport 443 {clients} -j ACCEPT",
+        ]
+        return tables
+
+    def initialize(self) -> bool:
+        payload = (
+            f"create {self.CLIENTS_SET} hash:ip,mac counters -exist\n"
+            f"create {self.DOWNLOAD_SET} hash:ip counters -exist\n"
+            f"flush {self.CLIENTS_SET}\n"
+            f"flush {self.DOWNLOAD_SET}\n"
+        )
+        result = self.runner.run(['ipset', 'restore'], input=payload)
+        if result.returncode != 0:
+            log.error("Error creando los sets de clientes", error=result.stderr.strip())
+            return False
+        return super().initialize()
+
+    def apply(self, authorize: List[Client] = (), revoke: List[Client] = ()) -> bool:
+        lines = []
+        for ip, mac in revoke:
+            if mac:
+                lines.append(f"del {self.CLIENTS_SET} {ip},{mac} -exist")
+            lines.append(f"del {self.DOWNLOAD_SET} {ip} -exist")
+        for ip, mac in authorize:
+            lines.append(f"add {self.CLIENTS_SET} {ip},{mac} -exist")
+            lines.append(f"add {self.DOWNLOAD_SET} {ip} -exist")
+        if not lines:
+            return True
+
+        result = self.runner.run(['ipset', 'restore'], input='\n'.join(lines) + '\n')
+        if result.returncode != 0:
+            log.error("Fallo en ipset restore", authorize=len(authorize), revoke=len(revoke),
+                      error=result.stderr.strip())
+            return False
+        if revoke:
+            self._drop_connections(revoke)
+        return True
+
+    def read_state(self) -> Optional[FirewallState]:
+        # Sin reglas por cliente: las cadenas tienen longitud fija y add/del con -exist son idempotentes
+        return None
+
+    def read_counters(self) -> dict:
+        result = self.runner.run(['ipset', 'save'], timeout=10)
+        if result.returncode != 0:
+            log.error("No se pudieron leer los contadores", error=result.stderr.strip())
+            return {}
+
+        up, down, packets = {}, {}, {}
+        for line in result.stdout.splitlines():
+            fields = line.split()
+            # add <set> <entrada> packets <n> bytes <n>
+            if len(fields) < 7 or fields[0] != 'add' or 'bytes' not in fields:
+                continue
+            nbytes = int(fields[fields.index('bytes') + 1])
+            pkts = int(fields[fields.index('packets') + 1])
+            if fields[1] == self.CLIENTS_SET:
+                ip, totals = fields[2].split(',')[0], up
+            elif fields[1] == self.DOWNLOAD_SET:
+                ip, totals = fields[2], down
+            else:
+                continue
+            totals[ip] = totals.get(ip, 0) + nbytes
+            packets[ip] = packets.get(ip, 0) + pkts
+        return {ip: (up.get(ip, 0), down.get(ip, 0), packets[ip]) for ip in packets}
+
+    def cleanup(self):
+        super().cleanup()
+        self.runner.run(['ipset', 'destroy', self.CLIENTS_SET])
+        self.runner.run(['ipset', 'destroy', self.DOWNLOAD_SET])
+
+
+class NftablesBackend(FirewallBackend):
+    """
+    Backend nativo de nftables: una tabla `ip netguard` propia, sin pasar
+    por la capa de compatibilidad de iptables.
+
+      set clients             ipv4_addr . ether_addr  pares autorizados; cuenta la subida
+      set download            ipv4_addr               mismas IP; cuenta la bajada
+      map authorized_ports    protocolo . puerto : veredicto (DNS externo, HTTP/HTTPS directos)
+
+    Como en IpsetBackend, las cadenas tienen un número fijo de reglas. Cada
+    cambio se aplica como una transacción atómica de `nft -f -`.
+    """
+
+    name = "nftables"
+
+    TABLE = "ip netguard"
+
+    def ruleset(self) -> str:
+        return f"""table {self.TABLE} {{
+    set clients {{
+        type ipv4_addr . ether_addr
+        counter
+    }}
+
+    set download {{
+        type ipv4_addr
+        counter
+    }}
+
+    # Declarada antes del mapa que salta a ella
+    chain external_dns {{
+        dnat to {EXTERNAL_DNS}:53
+    }}
+
+    map authorized_ports {{
+        type inet_proto . inet_service : verdict
+        elements = {{ udp . 53 : jump external_dns, tcp . 80 : accept, tcp . 443 : accept }}
+    }}
+
+    chain input {{
+        type filter hook input priority filter; policy accept;
+        iifname "{LAN_INTERFACE}" tcp dport {PORTAL_PORT} accept
+        iifname "{LAN_INTERFACE}" udp dport 53 accept
+    }}
+
+    chain forward {{
+        type filter hook forward priority filter; policy drop;
+        ip saddr . ether saddr @clients accept
+        ip daddr @download
+        ct state established,related accept
+    }}
+
+    chain prerouting {{
+        type nat hook prerouting priority dstnat; policy accept;
+        iifname "{LAN_INTERFACE}" ip saddr . ether saddr @clients meta l4proto . th dport vmap @authorized_ports
+        iifname "{LAN_INTERFACE}" tcp dport 80 dnat to {PORTAL_IP}:{PORTAL_PORT}
+    }}
+
+    chain postrouting {{
+        type nat hook postrouting priority srcnat; policy accept;
+        oifname "{WAN_INTERFACE}" masquerade
+    }}
+}}
+"""
+
+    def _nft(self, script: str):
+        return self.runner.run(['nft', '-f', '-'], input=script)
+
+    def initialize(self) -> bool:
+        # Crear y borrar antes de definir: sustituye la tabla entera en la misma transacción
+        script = f"add table {self.TABLE}\ndelete table {self.TABLE}\n" + self.ruleset()
+        result = self._nft(script)
+        if result.returncode != 0:
+            log.error("Error cargando la tabla nftables", error=result.stderr.strip())
+            return False
+        self._enable_forwarding()
+        return True
+
+    def _element_changes(self, authorize: List[Client], revoke: List[Client]) -> List[str]:
+        lines = []
+        pairs = [f"{ip} . {mac}" for ip, mac in revoke if mac]
+        if pairs:
+            lines.append(f"delete element {self.TABLE} clients {{ {', '.join(pairs)} }}")
+        if revoke:
+            lines.append(f"delete element {self.TABLE} download {{ {', '.join(ip for ip, _ in revoke)} }}")
+        if authorize:
+            pairs = ', '.join(f"{ip} . {mac}" for ip, mac in authorize)
+            lines.append(f"add element {self.TABLE} clients {{ {pairs} }}")
+            lines.append(f"add element {self.TABLE} download {{ {', '.join(ip for ip, _ in authorize)} }}")
+        return lines
+
+    def apply(self, authorize: List[Client] = (), revoke: List[Client] = ()) -> bool:
+        lines = self._element_changes(authorize, revoke)
+        if not lines:
+            return True
+
+        result = self._nft('\n'.join(lines) + '\n')
+        if result.returncode != 0:
+            # Borrar un elemento que no existe invalida la transacción: se repite por separado
+            log.warning("Fallo en la transacción nft, aplicando cambio a cambio",
+                        authorize=len(authorize), revoke=len(revoke), error=result.stderr.strip())
+            ok = True
+            for client in revoke:
+                results = [self._nft(line + '\n') for line in self._element_changes([], [client])]
+                if not all(_removed(result) for result in results):
+                    log.error("No se pudo revocar regla", ip=client[0])
+                    ok = False
+            if authorize and self._nft('\n'.join(self._element_changes(authorize, [])) + '\n').returncode != 0:
+                log.error("No se pudieron autorizar los clientes", count=len(authorize))
+                ok = False
+            if not ok:
+                return False
+
+        if revoke:
+            self._drop_connections(revoke)
+        return True
+
+    def read_counters(self) -> dict:
+        result = self.runner.run(['nft', '-j', 'list', 'table'] + self.TABLE.split(), timeout=10)
+        if result.returncode != 0:
+            log.error("No se pudieron leer los contadores", error=result.stderr.strip())
+            return {}
+        try:
+            objects = json.loads(result.stdout).get('nftables', [])
+        except ValueError:
+            return {}
+
+        up, down, packets = {}, {}, {}
+        for obj in objects:
+            nft_set = obj.get('set')
+            if not nft_set or nft_set.get('name') not in ('clients', 'download'):
+                continue
+            totals = up if nft_set['name'] == 'clients' else down
+            for element in nft_set.get('elem', ()):
+                entry = element.get('elem', {}) if isinstance(element, dict) else {}
+                counter = entry.get('counter')
+                if counter is None:
+                    continue
+                value = entry.get('val')
+                ip = value['concat'][0] if isinstance(value, dict) else value
+                totals[ip] = totals.get(ip, 0) + counter.get('bytes', 0)
+                packets[ip] = packets.get(ip, 0) + counter.get('packets', 0)
+        return {ip: (up.get(ip, 0), down.get(ip, 0), packets[ip]) for ip in packets}
+
+    def cleanup(self):
+        self._nft(f"delete table {self.TABLE}\n")
+
+
+BACKENDS = {
+    IptablesBackend.name: IptablesBackend,
+    IpsetBackend.name: IpsetBackend,
+    NftablesBackend.name: NftablesBackend,
+}
+
+
+def create_backend(name: str = FIREWALL_BACKEND, runner: CommandRunner = None) -> FirewallBackend:
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        log.warning("Backend de firewall desconocido, usando 'iptables'", backend=name)
+        backend_class = IptablesBackend
+    return backend_class(runner)
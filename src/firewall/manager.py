@@ -1,106 +1,126 @@
-import subprocess
 import threading
+from concurrent.futures import Future
 
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import LAN_INTERFACE, WAN_INTERFACE, PORTAL_IP, PORTAL_PORT, EXTERNAL_DNS
+from firewall.backends import FirewallBackend, create_backend
+from firewall.queue import FirewallQueue
+from log import get_logger
+
+
+log = get_logger("FIREWALL")
+
+
+def _done(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
 
 
 class FirewallManager:
     
-    def __init__(self):
+    def __init__(self, backend: FirewallBackend = None):
+        self.backend = backend or create_backend()
         self.authorized_ips = set()
         self.lock = threading.Lock()
-    
-    def _run(self, cmd: str) -> bool:
-        try:
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-            return result.returncode == 0
-        except:
-            return False
+        # Autorizaciones y revocaciones individuales pasan por la cola y se aplican por lotes
+        self.queue = FirewallQueue(self)
     
     def initialize_rules(self) -> bool:
-        
-        commands = [
-            # Limpiar reglas
-            "iptables -F",
-            "iptables -X",
-            "iptables -t nat -F",
-            
-            # Políticas por defecto
-            "iptables -P INPUT ACCEPT",
-            "iptables -P OUTPUT ACCEPT",
-            "iptables -P FORWARD DROP",  # Bloquear reenvío por defecto
-            
-            # Permitir conexiones establecidas
-            "iptables -A FORWARD -m state --state ESTABLISHED,RELATED -j ACCEPT",
-            
-            # Permitir acceso al portal y DNS
-            f"iptables -A INPUT -i {LAN_INTERFACE} -p tcp --dport {PORTAL_PORT} -j ACCEPT",
-            f"iptables -A INPUT -i {LAN_INTERFACE} -p udp --dport 53 -j ACCEPT",
-            
-            # Redirigir HTTP al portal cautivo
-            f"iptables -t nat -A PREROUTING -i {LAN_INTERFACE} -p tcp --dport 80 "
-            f"-j DNAT --to-destination {PORTAL_IP}:{PORTAL_PORT}",
-            
-            # NAT para salida a Internet
-            f"iptables -t nat -A POSTROUTING -o {WAN_INTERFACE} -j MASQUERADE",
-        ]
-        
-        for cmd in commands:
-            if not self._run(cmd):
-                print(f"[FIREWALL] Error ejecutando: {cmd}")
+        with self.lock:
+            if not self.backend.initialize():
                 return False
+            self.authorized_ips.clear()
         
-        # Habilitar IP forwarding 
-        self._run("sysctl -w net.ipv4.ip_forward=1")
-        
-        print("[FIREWALL] Reglas inicializadas")
+        log.info("Reglas inicializadas", backend=self.backend.name)
         return True
     
     def authorize_ip(self, ip: str, mac: str ) -> bool:
+        return self.authorize_async(ip, mac).result()
     
+    def authorize_async(self, ip: str, mac: str) -> Future:
+        """Encola la autorización; el Future se resuelve cuando la regla está aplicada."""
+        if not mac:
+            log.warning("No se puede autorizar sin MAC (anti-spoofing)", ip=ip)
+            return _done(False)
+        return self.queue.authorize(ip, mac)
+    
+    def apply_batch(self, authorize: list, revoke: list) -> tuple:
+        """
+        Aplica altas y bajas en una sola transacción del backend. Devuelve
+        (IP que quedan autorizadas, IP que quedan sin autorizar) de entre las
+        pedidas. Si la transacción falla, aplica las bajas juntas y las altas
+        una a una.
+        """
         with self.lock:
-            if ip in self.authorized_ips:
-                return True
-            
-            if not mac:
-                print(f"[FIREWALL][WARNING] No se puede autorizar {ip} sin MAC (anti-spoofing)")
-                return False
+            # Revocar una IP no autorizada no genera reglas, pero ya está en el estado pedido
+            unknown = {ip for ip, _ in revoke if ip not in self.authorized_ips}
+            revoke = [(ip, mac) for ip, mac in revoke if ip not in unknown]
+            revoking = {ip for ip, _ in revoke}
+            # Las que ya estaban autorizadas (y no se revocan) no generan reglas
+            already = {ip for ip, _ in authorize if ip in self.authorized_ips and ip not in revoking}
+            authorize = [(ip, mac) for ip, mac in authorize if ip not in already]
             
-            # Vincular IP+MAC en el firewall 
-            rule = f"iptables -I FORWARD -s {ip} -m mac --mac-source {mac} -j ACCEPT"
-            if self._run(rule):
-                self._run(f"iptables -t nat -I PREROUTING 1 -i {LAN_INTERFACE} -m mac --mac-source {mac} -p udp --dport 53 -j DNAT --to-destination {EXTERNAL_DNS}:53")
-                self._run(f"iptables -t nat -I PREROUTING 1 -i {LAN_INTERFACE} -m mac --mac-source {mac} -p tcp --dport 80 -j ACCEPT")
-                self._run(f"iptables -t nat -I PREROUTING 1 -i {LAN_INTERFACE} -m mac --mac-source {mac} -p tcp --dport 443 -j ACCEPT")
-                self.authorized_ips.add(ip)
-                print(f"[FIREWALL] IP autorizada con MAC: {ip} ({mac})")
-                return True
+            if self.backend.apply(authorize, revoke):
+                authorized = {ip for ip, _ in authorize}
+            else:
+                log.warning("Fallo aplicando el lote, reintentando por cliente",
+                            authorize=len(authorize), revoke=len(revoke))
+                if not self.backend.revoke(revoke):
+                    # Se dan por revocadas igualmente: el reconciliador borra las reglas que queden
+                    log.error("No se pudieron revocar todas las reglas", count=len(revoke))
+                authorized = {ip for ip, mac in authorize if self.backend.authorize([(ip, mac)])}
             
-            print(f"[FIREWALL][ERROR] No se pudo crear regla para {ip}")
-            return False
+            self.authorized_ips.difference_update(revoking)
+            self.authorized_ips.update(authorized)
+        
+        for ip, mac in authorize:
+            if ip in authorized:
+                log.info("IP autorizada", ip=ip, mac=mac)
+            else:
+                log.error("No se pudo crear regla", ip=ip)
+        for ip in revoking:
+            log.info("IP revocada", ip=ip)
+        return authorized | already, revoking | unknown
     
-    def revoke_ip(self, ip: str, mac: str = None) -> bool:
+    def authorize_many(self, clients) -> list:
+        """
+        Autoriza varios pares (ip, mac) en una sola transacción del backend,
+        sin pasar por la cola. Si el lote falla se autoriza cliente a cliente.
+        Devuelve las IP autorizadas.
+        """
         with self.lock:
-            if ip not in self.authorized_ips:
-                return False
-            
-            if mac:
-                self._run(f"iptables -I FORWARD 1 -i {LAN_INTERFACE} -m mac --mac-source {mac} -j DROP")
-                self._run(f"conntrack -D -s {ip} 2>/dev/null; conntrack -D -d {ip} 2>/dev/null; true")
-                self._run(f"iptables -t nat -D PREROUTING -i {LAN_INTERFACE} -m mac --mac-source {mac} -p udp --dport 53 -j DNAT --to-destination {EXTERNAL_DNS}:53")
-                self._run(f"iptables -t nat -D PREROUTING -i {LAN_INTERFACE} -m mac --mac-source {mac} -p tcp --dport 80 -j ACCEPT")
-                self._run(f"iptables -t nat -D PREROUTING -i {LAN_INTERFACE} -m mac --mac-source {mac} -p tcp --dport 443 -j ACCEPT")
-                
-            
-            self.authorized_ips.discard(ip)
-            print(f"[FIREWALL] IP revocada: {ip}")
-            return True
+            pending = [(ip, mac) for ip, mac in clients if mac and ip not in self.authorized_ips]
+            if not pending:
+                return []
+            if self.backend.authorize(pending):
+                self.authorized_ips.update(ip for ip, _ in pending)
+                log.info("IPs autorizadas en lote", count=len(pending))
+                return [ip for ip, _ in pending]
+        
+        log.warning("Fallo autorizando el lote, autorizando una a una", count=len(pending))
+        with self.lock:
+            authorized = [ip for ip, mac in pending if self.backend.authorize([(ip, mac)])]
+            self.authorized_ips.update(authorized)
+        return authorized
+    
+    def revoke_ip(self, ip: str, mac: str = None) -> bool:
+        return self.revoke_async(ip, mac).result()
+    
+    def revoke_async(self, ip: str, mac: str = None) -> Future:
+        return self.queue.revoke(ip, mac)
+    
+    def read_counters(self) -> dict:
+        """
+        Contadores de todas las IP autorizadas con una sola lectura del
+        firewall: {ip: (bytes_subida, bytes_bajada, paquetes)}.
+        """
+        counters = self.backend.read_counters()
+        authorized = self.authorized_ips
+        return {ip: values for ip, values in counters.items() if ip in authorized}
     
     def cleanup(self):
-        self._run("iptables -F")
-        self._run("iptables -t nat -F")
-        self._run("iptables -P FORWARD ACCEPT")
-        print("[FIREWALL] Reglas limpiadas")
+        self.queue.stop()
+        self.backend.cleanup()
+        log.info("Reglas limpiadas")
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import FIREWALL_BATCH_WINDOW, FIREWALL_BATCH_SIZE
+from log import get_logger
+
+
+log = get_logger("FIREWALL")
+
+AUTHORIZE = "authorize"
+REVOKE = "revoke"
+
+
+class _Intent:
+
+    __slots__ = ('op', 'ip', 'mac', 'futures')
+
+    def __init__(self, op: str, ip: str, mac: str):
+        self.op = op
+        self.ip = ip
+        self.mac = mac
+        self.futures = []
+
+
+class FirewallQueue:
+    """
+    Cola de cambios del firewall con agrupación.
+
+    authorize()/revoke() encolan la intención y devuelven un Future. Un único
+    worker espera a que llegue la primera, junta todo lo que llegue en los
+    siguientes `window` segundos (o hasta `max_batch` clientes) y lo aplica
+    con una sola transacción de FirewallManager.apply_batch(). Dentro de una
+    ventana:
+      - repetir la misma operación para una IP reutiliza la pendiente;
+      - una operación opuesta con la misma MAC anula la pendiente y ambas se
+        resuelven sin tocar el firewall (p. ej. login y logout inmediato).
+    El resultado de cada Future es True si la IP quedó en el estado pedido.
+    """
+
+    def __init__(self, manager, window: float = FIREWALL_BATCH_WINDOW, max_batch: int = FIREWALL_BATCH_SIZE):
+        self.manager = manager
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = OrderedDict()   # {ip: [_Intent, ...]} en orden de llegada
+        self._count = 0
+        self._cond = threading.Condition()
+        self._running = True
+        self.batches = 0
+        self.cancelled = 0
+        self._thread = threading.Thread(target=self._run, name='firewall-queue', daemon=True)
+        self._thread.start()
+
+    def authorize(self, ip: str, mac: str) -> Future:
+        return self._submit(AUTHORIZE, ip, mac)
+
+    def revoke(self, ip: str, mac: str = None) -> Future:
+        return self._submit(REVOKE, ip, mac)
+
+    def _submit(self, op: str, ip: str, mac: str) -> Future:
+        future = Future()
+        with self._cond:
+            if not self._running:
+                future.set_result(False)
+                return future
+            intents = self._pending.setdefault(ip, [])
+            last = intents[-1] if intents else None
+            if last is not None and last.op == op and last.mac == mac:
+                last.futures.append(future)
+                return future
+            if last is not None and last.op != op and last.mac == mac:
+                intents.pop()
+                self._count -= 1
+                self.cancelled += 1
+                for pending in last.futures:
+                    pending.set_result(True)
+                # Si la pendiente cambiaba algo, ambas se anulan y el firewall
+                # queda como estaba; si no (p. ej. autorizar una IP ya
+                # autorizada), sólo se descarta la pendiente.
+                if (last.op == AUTHORIZE) != (ip in self.manager.authorized_ips):
+                    if not intents:
+                        del self._pending[ip]
+                    future.set_result(True)
+                    return future
+            intent = _Intent(op, ip, mac)
+            intent.futures.append(future)
+            intents.append(intent)
+            self._count += 1
+            self._cond.notify()
+        return future
+
+    def _take_batch(self) -> list:
+        with self._cond:
+            while self._running and not self._count:
+                self._cond.wait()
+            deadline = time.monotonic() + self.window
+            while self._running and self._count < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = []
+            while self._pending and len(batch) < self.max_batch:
+                ip, intents = self._pending.popitem(last=False)
+                batch.extend(intents)
+            self._count -= len(batch)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                if not self._running:
+                    return
+                continue
+            self._apply(batch)
+
+    def _apply(self, batch: list):
+        # Una IP puede traer revocar + autorizar (otra MAC): las bajas se aplican antes
+        authorize = [(i.ip, i.mac) for i in batch if i.op == AUTHORIZE]
+        revoke = [(i.ip, i.mac) for i in batch if i.op == REVOKE]
+        try:
+            authorized, revoked = self.manager.apply_batch(authorize, revoke)
+        except Exception as e:
+            log.error("Error aplicando lote del firewall", error=e, size=len(batch))
+            authorized, revoked = set(), set()
+        self.batches += 1
+        for intent in batch:
+            done = authorized if intent.op == AUTHORIZE else revoked
+            for future in intent.futures:
+                future.set_result(intent.ip in done)
+
+    def stop(self):
+        """Aplica lo pendiente y detiene el worker."""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout=5)
+        with self._cond:
+            leftover = [i for intents in self._pending.values() for i in intents]
+            self._pending.clear()
+            self._count = 0
+        if leftover:
+            self._apply(leftover)
@@ -0,0 +1,80 @@
+import threading
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import FIREWALL_RECONCILE_INTERVAL
+from log import get_logger
+
+
+log = get_logger("FIREWALL")
+
+
+class FirewallReconciler:
+    """
+    Compara periódicamente el firewall real con las sesiones y corrige la
+    diferencia.
+
+    Cada pasada lee el ruleset una sola vez (FirewallBackend.read_state) y,
+    con el lock del FirewallManager para que ningún lote se cuele en medio,
+    deja un juego de reglas por cada sesión autorizada: borra duplicadas,
+    huérfanas y restos de versiones anteriores y repone las que falten, todo
+    en una transacción. Las IP autorizadas sin sesión se respetan una pasada
+    (puede ser un login en curso) y se revocan si siguen así en la siguiente.
+
+    `forward_rules` guarda la longitud de la cadena FORWARD en la última
+    lectura, antes de corregir: debe crecer y decrecer con las sesiones.
+    """
+
+    def __init__(self, firewall, session_manager, interval: float = FIREWALL_RECONCILE_INTERVAL):
+        self.firewall = firewall
+        self.session_manager = session_manager
+        self.interval = interval
+        self.forward_rules = None
+        self.passes = 0
+        self._orphans = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not self.interval:
+            return
+        self._thread = threading.Thread(target=self._run, name='firewall-reconcile', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.reconcile()
+            except Exception as e:
+                log.error("Error reconciliando el firewall", error=e)
+
+    def reconcile(self) -> bool:
+        """Una pasada. Devuelve False si el backend no permite leer su estado."""
+        clients = self.session_manager.get_clients()
+        manager = self.firewall
+        with manager.lock:
+            state = manager.backend.read_state()
+            if state is None:
+                return False
+            desired = {ip: mac for ip, mac in clients.items() if ip in manager.authorized_ips}
+            in_flight = manager.authorized_ips - desired.keys()
+            added, removed = manager.backend.repair(state, desired, keep=in_flight)
+
+        orphans = {ip for ip in in_flight if ip not in clients}
+        for ip in orphans & self._orphans:
+            log.warning("IP autorizada sin sesión, revocando", ip=ip)
+            manager.revoke_async(ip, state.clients.get(ip))
+        self._orphans = orphans - self._orphans
+
+        self.forward_rules = state.forward_rules
+        self.passes += 1
+        if added or removed:
+            log.warning("Firewall reconciliado", added=added, removed=removed,
+                        forward_rules=self.forward_rules, clients=len(desired))
+        else:
+            log.debug("Firewall en orden", forward_rules=self.forward_rules, clients=len(desired))
+        return True
+
+    def stop(self):
+        self._stop.set()
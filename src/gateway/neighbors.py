@@ -0,0 +1,97 @@
+"""
+Tabla de vecinos (ARP) del gateway: IP -> MAC.
+
+Se lee la tabla completa de una vez (/proc/net/arp o, si no está disponible,
+una única llamada a `ip -j neigh show`) y se guarda como instantánea con un
+TTL corto. Resolver una IP es una búsqueda en un dict, no un proceso nuevo.
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import NEIGHBOR_CACHE_TTL
+
+
+PROC_ARP = "/proc/net/arp"
+
+ATF_COMPLETE = 0x2
+
+EMPTY_MAC = "00:00:00:00:00:00"
+
+# Estados de `ip neigh` sin dirección MAC válida
+_INVALID_STATES = {"FAILED", "INCOMPLETE"}
+
+# Un cliente recién conectado puede no estar aún en la instantánea; ante un
+# fallo se relee la tabla, pero como mucho una vez por este intervalo.
+MISS_REFRESH_INTERVAL = 0.5
+
+
+def _normalize(mac: str) -> str:
+    return mac.lower().replace('-', ':')
+
+
+def read_proc_arp(path: str = PROC_ARP) -> Dict[str, str]:
+    table = {}
+    with open(path, 'r') as f:
+        next(f, None)  # cabecera
+        for line in f:
+            fields = line.split()
+            if len(fields) < 4:
+                continue
+            ip, flags, mac = fields[0], int(fields[2], 16), fields[3]
+            if flags & ATF_COMPLETE and mac != EMPTY_MAC:
+                table[ip] = _normalize(mac)
+    return table
+
+
+def read_ip_neigh() -> Dict[str, str]:
+    result = subprocess.run(['ip', '-j', 'neigh', 'show'], capture_output=True, text=True, timeout=5)
+    table = {}
+    for entry in json.loads(result.stdout or '[]'):
+        mac = entry.get('lladdr')
+        states = set(entry.get('state', ()))
+        if mac and 'dst' in entry and not states & _INVALID_STATES:
+            table[entry['dst']] = _normalize(mac)
+    return table
+
+
+class NeighborTable:
+
+    def __init__(self, ttl: float = NEIGHBOR_CACHE_TTL):
+        self.ttl = ttl
+        self._table = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, str]:
+        try:
+            return read_proc_arp()
+        except OSError:
+            pass
+        try:
+            return read_ip_neigh()
+        except Exception:
+            return {}
+
+    def snapshot(self, max_age: float = None) -> Dict[str, str]:
+        """Tabla completa, releída si la instantánea tiene más de `max_age` segundos."""
+        max_age = self.ttl if max_age is None else max_age
+        if time.monotonic() - self._loaded_at <= max_age:
+            return self._table
+        with self._lock:
+            # Otro thread pudo refrescarla mientras esperábamos
+            if time.monotonic() - self._loaded_at > max_age:
+                self._table = self._read()
+                self._loaded_at = time.monotonic()
+            return self._table
+
+    def lookup(self, ip_address: str) -> Optional[str]:
+        mac = self.snapshot().get(ip_address)
+        if mac is None:
+            mac = self.snapshot(MISS_REFRESH_INTERVAL).get(ip_address)
+        return mac
@@ -0,0 +1,295 @@
+import socket
+import selectors
+import queue
+import time
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    PORTAL_IP, PORTAL_PORT, BUFFER_SIZE, SOCKET_TIMEOUT,
+    EVENT_LOOP_HANDLER_THREADS, EVENT_LOOP_MAX_PENDING, KEEPALIVE_TIMEOUT, KEEPALIVE_MAX_REQUESTS
+)
+from http_server.server import PortalServerBase
+from http_server.handlers import RequestHandler
+from http_server.request import RequestParser, RequestError
+from http_server.responses import encode_response
+from log import get_logger
+
+
+log = get_logger("HTTP")
+
+
+class _Connection:
+    """Estado de una conexión no bloqueante."""
+
+    __slots__ = ('sock', 'address', 'parser', 'outbuf', 'last_active', 'busy',
+                 'served', 'keep_alive')
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.parser = RequestParser()
+        self.outbuf = b''
+        self.last_active = time.monotonic()
+        self.busy = False
+        self.served = 0
+        self.keep_alive = False
+
+
+class EventLoopPortalServer(PortalServerBase):
+    """
+    Motor alternativo: un único event loop (selectors) con sockets no
+    bloqueantes. Los handlers, que pueden bloquear (autenticación, firewall),
+    se ejecutan en un pool pequeño y su respuesta vuelve al loop. Con
+    `max_pending` peticiones ya en el pool, las nuevas se rechazan con
+    OVERLOAD_RESPONSE, igual que el motor threaded con la cola llena.
+    """
+
+    def __init__(self, session_manager, user_manager,
+                 host: str = PORTAL_IP, port: int = PORTAL_PORT,
+                 max_pending: int = EVENT_LOOP_MAX_PENDING):
+        super().__init__(session_manager, user_manager, host=host, port=port)
+        self.selector = None
+        self.connections = {}
+        self.max_pending = max_pending
+        self._pending = 0
+        self._executor = None
+        self._completed = queue.SimpleQueue()
+        self._wakeup_r = None
+        self._wakeup_w = None
+        self._recv_view = memoryview(bytearray(BUFFER_SIZE))
+
+    def start(self):
+        self._listen()
+        self.server_socket.setblocking(False)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server_socket, selectors.EVENT_READ, None)
+
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=EVENT_LOOP_HANDLER_THREADS,
+            thread_name_prefix='portal-handler'
+        )
+
+        self.running = True
+        self._start_stats()
+        log.info("Servidor iniciado", url=f"http://{self.host}:{self.port}",
+                 engine="eventloop", workers=EVENT_LOOP_HANDLER_THREADS, queue=self.max_pending)
+
+        self._event_loop()
+
+    def _event_loop(self):
+        next_sweep = time.monotonic() + 1.0
+        while self.running:
+            try:
+                events = self.selector.select(timeout=1.0)
+            except OSError:
+                if not self.running:
+                    break
+                raise
+
+            for key, mask in events:
+                if key.fileobj is self.server_socket:
+                    self._accept()
+                elif key.fileobj is self._wakeup_r:
+                    self._drain_completed()
+                else:
+                    conn = key.data
+                    if mask & selectors.EVENT_READ:
+                        self._on_readable(conn)
+                    if mask & selectors.EVENT_WRITE and conn.sock.fileno() != -1:
+                        self._on_writable(conn)
+
+            now = time.monotonic()
+            if now >= next_sweep:
+                self._sweep_idle(now)
+                next_sweep = now + 1.0
+
+    def _accept(self):
+        while True:
+            try:
+                client_socket, client_address = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                if self.running:
+                    log.error("Error aceptando conexión", error=e)
+                return
+
+            self.accepted += 1
+            client_socket.setblocking(False)
+            conn = _Connection(client_socket, client_address)
+            self.connections[client_socket.fileno()] = conn
+            self.selector.register(client_socket, selectors.EVENT_READ, conn)
+
+    def _on_readable(self, conn: _Connection):
+        try:
+            received = conn.sock.recv_into(self._recv_view)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close(conn)
+            return
+
+        if not received:
+            self._close(conn)
+            return
+
+        conn.last_active = time.monotonic()
+        conn.parser.feed(self._recv_view[:received])
+        self._next_request(conn)
+
+    def _next_request(self, conn: _Connection):
+        """Atiende la siguiente petición completa del buffer, si la hay."""
+        try:
+            request = conn.parser.next_request()
+        except RequestError as e:
+            conn.keep_alive = False
+            self._reply(conn, RequestHandler.error_response(e.status, str(e)))
+            return
+
+        if request is None:
+            return
+
+        conn.served += 1
+        log.debug("Petición", sample="request", client=conn.address[0],
+                  method=request.method, path=request.path)
+        conn.keep_alive = request.keep_alive() and conn.served < KEEPALIVE_MAX_REQUESTS
+
+        # Sondas y límites de tasa se responden en el propio loop, sin pasar por el pool
+        response = self._fast_response(request, conn.address[0])
+        if response is not None:
+            self._reply(conn, response)
+            return
+
+        if self._pending >= self.max_pending:
+            self._forget(conn)
+            self._shed(conn.sock)
+            return
+
+        self._pending += 1
+        conn.busy = True
+        self.selector.unregister(conn.sock)
+        future = self._executor.submit(self._run_handler, request, conn.address)
+        future.add_done_callback(lambda f, c=conn: self._complete(c, f))
+
+    def _reply(self, conn: _Connection, response: tuple):
+        conn.outbuf = encode_response(response, conn.keep_alive)
+        self.selector.modify(conn.sock, selectors.EVENT_WRITE, conn)
+
+    def _complete(self, conn: _Connection, future):
+        self._completed.put((conn, future))
+        try:
+            self._wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _drain_completed(self):
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+        while True:
+            try:
+                conn, future = self._completed.get_nowait()
+            except queue.Empty:
+                return
+            self._pending -= 1
+            if conn.sock.fileno() == -1:
+                continue
+            try:
+                conn.outbuf = encode_response(future.result(), conn.keep_alive)
+            except Exception as e:
+                log.error("Error manejando cliente", client=conn.address[0], error=e)
+                self._close(conn)
+                continue
+            conn.busy = False
+            conn.last_active = time.monotonic()
+            self.selector.register(conn.sock, selectors.EVENT_WRITE, conn)
+
+    def _on_writable(self, conn: _Connection):
+        try:
+            sent = conn.sock.send(conn.outbuf)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close(conn)
+            return
+
+        conn.outbuf = conn.outbuf[sent:]
+        conn.last_active = time.monotonic()
+        if conn.outbuf:
+            return
+        if not conn.keep_alive:
+            self._close(conn)
+            return
+
+        # Conexión persistente: vuelve a leer y atiende lo ya encolado (pipelining)
+        self.selector.modify(conn.sock, selectors.EVENT_READ, conn)
+        self._next_request(conn)
+
+    def _sweep_idle(self, now: float):
+        request_deadline = now - SOCKET_TIMEOUT
+        keepalive_deadline = now - KEEPALIVE_TIMEOUT
+        idle = []
+        for conn in self.connections.values():
+            if conn.busy or conn.outbuf:
+                continue
+            waiting_next = conn.served and not conn.parser.has_pending_data()
+            if conn.last_active < (keepalive_deadline if waiting_next else request_deadline):
+                idle.append(conn)
+        for conn in idle:
+            self._close(conn)
+
+    def _forget(self, conn: _Connection):
+        """Saca la conexión del loop sin cerrar el socket."""
+        self.connections.pop(conn.sock.fileno(), None)
+        try:
+            self.selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+
+    def _close(self, conn: _Connection):
+        if conn.sock.fileno() == -1:
+            return
+        self._forget(conn)
+        conn.sock.close()
+
+    def get_stats(self) -> dict:
+        return {
+            'workers': EVENT_LOOP_HANDLER_THREADS,
+            'connections': len(self.connections),
+            'queue_depth': self._pending,
+            'queue_size': self.max_pending,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'probes': self.probes.hits,
+            'rate_limited_probes': self.probe_limiter.rejected,
+            'rate_limited_logins': self.login_limiter.rejected,
+        }
+
+    def stop(self):
+        self.running = False
+        self._stats_stop.set()
+        if self._wakeup_w:
+            try:
+                self._wakeup_w.send(b'\0')
+            except OSError:
+                pass
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        for conn in list(self.connections.values()):
+            self._close(conn)
+        if self.server_socket:
+            self.server_socket.close()
+        log.info("Servidor detenido")
+
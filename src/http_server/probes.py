@@ -0,0 +1,47 @@
+import sys
+import os
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from http_server.responses import (
+    PROBE_RESPONSES, PROBE_ONLINE_RESPONSES, PROBE_HEAD_RESPONSES, PROBE_ONLINE_HEAD_RESPONSES,
+    TOO_MANY_REQUESTS
+)
+from log import get_logger
+
+
+log = get_logger("HTTP")
+
+
+class ProbeResponder:
+    """
+    Camino rápido para las sondas de conectividad de los sistemas operativos.
+
+    Reconoce la sonda sólo con el método y la ruta de la línea de petición y
+    responde con respuestas precodificadas, sin construir un RequestHandler:
+    "online" para clientes autenticados y la redirección al login para el
+    resto. HEAD recibe las mismas cabeceras sin cuerpo. Si se le pasa un
+    limitador, las sondas que lo superan reciben un 429 precodificado.
+    """
+
+    def __init__(self, session_manager, limiter=None):
+        self.session_manager = session_manager
+        self.limiter = limiter
+        self.hits = 0
+
+    def respond(self, method: str, path: str, client_ip: str) -> Optional[tuple]:
+        if method == 'GET':
+            offline, online = PROBE_RESPONSES, PROBE_ONLINE_RESPONSES
+        elif method == 'HEAD':
+            offline, online = PROBE_HEAD_RESPONSES, PROBE_ONLINE_HEAD_RESPONSES
+        else:
+            return None
+        if path not in offline:
+            return None
+        self.hits += 1
+        log.debug("Sonda", sample="probe", ip=client_ip, path=path)
+        if self.limiter is not None and not self.limiter.allow(client_ip):
+            return TOO_MANY_REQUESTS
+        if self.session_manager.is_authenticated(client_ip):
+            return online[path]
+        return offline[path]
@@ -0,0 +1,59 @@
+import time
+import threading
+import sys
+import os
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import RATE_LIMIT_IDLE_TTL, RATE_LIMIT_MAX_CLIENTS
+
+
+class TokenBucketLimiter:
+    """
+    Limitador token-bucket en memoria, una cubeta por cliente.
+
+    Cada `allow()` es O(1): recarga la cubeta según el tiempo transcurrido y
+    la mueve al final de un OrderedDict, de modo que las cubetas inactivas
+    quedan al principio y se desalojan sin recorrer la tabla.
+    """
+
+    def __init__(self, rate: float, burst: float,
+                 idle_ttl: float = RATE_LIMIT_IDLE_TTL,
+                 max_clients: int = RATE_LIMIT_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.idle_ttl = idle_ttl
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # {clave: [tokens, último acceso]}
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [self.burst, now]
+                self._buckets[key] = bucket
+                self._evict(now)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True
+            self.rejected += 1
+            return False
+
+    def _evict(self, now: float):
+        buckets = self._buckets
+        while buckets:
+            key, (_, last) = next(iter(buckets.items()))
+            if now - last < self.idle_ttl and len(buckets) <= self.max_clients:
+                return
+            del buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
@@ -0,0 +1,127 @@
+import sys
+import os
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import MAX_HEADER_SIZE, MAX_BODY_SIZE
+
+
+class RequestError(Exception):
+    """Petición malformada o fuera de límites; `status` es el código HTTP a devolver."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class HTTPRequest:
+    """Petición ya parseada. Las cabeceras van en minúsculas y el cuerpo en bytes."""
+
+    __slots__ = ('method', 'path', 'query', 'version', 'headers', 'body')
+
+    def __init__(self, method: str, path: str, query: str, version: str,
+                 headers: dict, body: bytes):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    def keep_alive(self) -> bool:
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.1':
+            return 'close' not in connection
+        return 'keep-alive' in connection
+
+
+class RequestParser:
+    """
+    Parser incremental de HTTP/1.x sobre bytes.
+
+    Se alimenta con `feed()` a medida que llegan datos del socket y
+    `next_request()` devuelve una petición sólo cuando las cabeceras y los
+    `Content-Length` bytes del cuerpo están completos.
+    """
+
+    def __init__(self, max_header_size: int = MAX_HEADER_SIZE,
+                 max_body_size: int = MAX_BODY_SIZE):
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self._buf = bytearray()
+        self._head = None  # (method, path, query, version, headers, body_start, body_len)
+
+    def feed(self, data) -> None:
+        self._buf += data
+
+    def has_pending_data(self) -> bool:
+        return bool(self._buf)
+
+    def next_request(self) -> Optional[HTTPRequest]:
+        if self._head is None:
+            header_end = self._buf.find(b'\r\n\r\n', 0, self.max_header_size + 4)
+            if header_end < 0:
+                if len(self._buf) > self.max_header_size:
+                    raise RequestError(431, "Cabeceras demasiado grandes")
+                return None
+            self._head = self._parse_head(header_end)
+
+        method, path, query, version, headers, body_start, body_len = self._head
+        end = body_start + body_len
+        if len(self._buf) < end:
+            return None
+
+        body = bytes(self._buf[body_start:end])
+        del self._buf[:end]
+        self._head = None
+        return HTTPRequest(method, path, query, version, headers, body)
+
+    def _parse_head(self, header_end: int) -> tuple:
+        lines = bytes(self._buf[:header_end]).split(b'\r\n')
+
+        request_line = lines[0].split(b' ')
+        if len(request_line) != 3:
+            raise RequestError(400, "Línea de petición inválida")
+        method = request_line[0].decode('ascii', errors='replace')
+        target = request_line[1].decode('latin-1')
+        version = request_line[2].decode('ascii', errors='replace')
+
+        path, _, query = target.partition('?')
+
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(b':')
+            if not sep:
+                continue
+            headers[name.strip().lower().decode('latin-1')] = value.strip().decode('latin-1')
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise RequestError(501, "Transfer-Encoding no soportado")
+
+        body_len = 0
+        if 'content-length' in headers:
+            try:
+                body_len = int(headers['content-length'])
+            except ValueError:
+                raise RequestError(400, "Content-Length inválido")
+            if body_len < 0:
+                raise RequestError(400, "Content-Length inválido")
+            if body_len > self.max_body_size:
+                raise RequestError(413, "Cuerpo demasiado grande")
+
+        return method, path, query, version, headers, header_end + 4, body_len
+
+
+def read_request(sock, parser: RequestParser, view: memoryview) -> Optional[HTTPRequest]:
+    """
+    Lee del socket (bloqueante) hasta completar una petición, reutilizando
+    `view` como buffer de recepción. Devuelve None si el cliente cierra antes.
+    """
+    while True:
+        request = parser.next_request()
+        if request is not None:
+            return request
+        received = sock.recv_into(view)
+        if not received:
+            return None
+        parser.feed(view[:received])
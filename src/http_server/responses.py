@@ -0,0 +1,123 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    CAPTIVE_DETECTION_PATHS, PORTAL_IP, PORTAL_PORT, HTTP_OVERLOAD_RESPONSE, KEEPALIVE_TIMEOUT
+)
+
+# Una respuesta es una tupla (cabecera, cuerpo) en bytes. La cabecera no
+# incluye "Connection" ni la línea en blanco final: el servidor añade
+# CONNECTION_KEEP_ALIVE o CONNECTION_CLOSE según la conexión.
+
+
+STATUS_TEXT = {
+    200: 'OK', 204: 'No Content', 302: 'Found', 400: 'Bad Request', 404: 'Not Found',
+    413: 'Payload Too Large', 429: 'Too Many Requests', 431: 'Request Header Fields Too Large',
+    501: 'Not Implemented', 503: 'Service Unavailable',
+}
+
+LOGIN_URL = f"http://{PORTAL_IP}:{PORTAL_PORT}/login"
+STATUS_URL = f"http://{PORTAL_IP}:{PORTAL_PORT}/status"
+
+
+CONNECTION_KEEP_ALIVE = f"Connection: keep-alive\r\nKeep-Alive: timeout={KEEPALIVE_TIMEOUT}\r\n\r\n".encode('ascii')
+
+CONNECTION_CLOSE = b"Connection: close\r\n\r\n"
+
+
+def build_response(status_code: int, body: bytes = b'', content_type: str = 'text/html',
+                   extra_headers: tuple = ()) -> tuple:
+    headers = [f"HTTP/1.1 {status_code} {STATUS_TEXT.get(status_code, 'OK')}"]
+    if body:
+        headers.append(f"Content-Type: {content_type}; charset=utf-8")
+    headers.extend(extra_headers)
+    # Un 204 no lleva cuerpo ni Content-Length
+    if status_code != 204:
+        headers.append(f"Content-Length: {len(body)}")
+    headers.append("Cache-Control: no-cache, no-store")
+    return ('\r\n'.join(headers) + '\r\n').encode('utf-8'), body
+
+
+def head_response(response: tuple) -> tuple:
+    """Variante para HEAD: mismas cabeceras (Content-Length incluido), sin cuerpo."""
+    return response[0], b''
+
+
+def encode_response(response: tuple, keep_alive: bool) -> bytes:
+    head, body = response
+    return b''.join((head, CONNECTION_KEEP_ALIVE if keep_alive else CONNECTION_CLOSE, body))
+
+
+def build_redirect(location: str) -> tuple:
+    body = f'<html><body>Redirigiendo a <a href="{location}">{location}</a></body></html>'
+    return build_response(302, body.encode('utf-8'), extra_headers=(f"Location: {location}",))
+
+
+def build_error(status_code: int, message: str) -> tuple:
+    return build_response(status_code, f"<html><body><h1>{message}</h1></body></html>".encode('utf-8'))
+
+
+# Respuestas fijas, construidas una única vez al importar el módulo
+
+REDIRECT_LOGIN = build_redirect(LOGIN_URL)
+
+REDIRECT_STATUS = build_redirect(STATUS_URL)
+
+SERVICE_UNAVAILABLE = build_response(503, extra_headers=("Retry-After: 1",))
+
+TOO_MANY_REQUESTS = build_response(429, extra_headers=("Retry-After: 5",))
+
+OVERLOAD_RESPONSE = encode_response(
+    REDIRECT_LOGIN if HTTP_OVERLOAD_RESPONSE == "302" else SERVICE_UNAVAILABLE,
+    keep_alive=False
+)
+
+PROBE_RESPONSES = {path: REDIRECT_LOGIN for path in CAPTIVE_DETECTION_PATHS}
+
+# Respuesta "hay Internet" que espera cada sistema operativo; con ella el
+# dispositivo deja de sondear el portal tras el login.
+_APPLE_SUCCESS = build_response(
+    200, b'<HTML><HEAD><TITLE>Success</TITLE></HEAD><BODY>Success</BODY></HTML>'
+)
+_NO_CONTENT = build_response(204)
+
+PROBE_ONLINE_RESPONSES = {
+    "/generate_204": _NO_CONTENT,                    # Android / Chrome
+    "/gen_204": _NO_CONTENT,
+    "/hotspot-detect.html": _APPLE_SUCCESS,          # Apple iOS/macOS
+    "/library/test/success.html": _APPLE_SUCCESS,
+    "/ncsi.txt": build_response(200, b'Microsoft NCSI', 'text/plain'),                  # Windows
+    "/connecttest.txt": build_response(200, b'Microsoft Connect Test', 'text/plain'),
+    "/success.txt": build_response(200, b'success\n', 'text/plain'),                    # Firefox
+    "/kindle-wifi/wifistub.html": build_response(                                       # Amazon Kindle
+        200,
+        b'<html><head><title>Kindle Reachability Probe Page</title>'
+        b'<!--81ce4465-7167-4dcb-835b-dcc9e44c112a created with python 2.5 uuid.uuid4()-->'
+        b'</head><body></body></html>'
+    ),
+}
+for _path in CAPTIVE_DETECTION_PATHS:
+    PROBE_ONLINE_RESPONSES.setdefault(_path, _NO_CONTENT)
+
+PROBE_HEAD_RESPONSES = {path: head_response(r) for path, r in PROBE_RESPONSES.items()}
+PROBE_ONLINE_HEAD_RESPONSES = {path: head_response(r) for path, r in PROBE_ONLINE_RESPONSES.items()}
+
+
+# Tabla de rutas fijas: {(autenticado, ruta): respuesta}. Las rutas que
+# dependen de la petición (login, status, logout autenticado) no aparecen.
+FIXED_ROUTES = {
+    (False, '/status'): REDIRECT_LOGIN,
+    (False, '/logout'): REDIRECT_LOGIN,
+    (True, '/login'): REDIRECT_STATUS,
+    (True, '/'): REDIRECT_STATUS,
+}
+for _path in CAPTIVE_DETECTION_PATHS:
+    FIXED_ROUTES[(False, _path)] = PROBE_RESPONSES[_path]
+    FIXED_ROUTES[(True, _path)] = PROBE_ONLINE_RESPONSES[_path]
+
+# Respuesta por defecto para rutas desconocidas
+DEFAULT_ROUTES = {
+    False: REDIRECT_LOGIN,
+    True: REDIRECT_STATUS,
+}
@@ -1,75 +1,371 @@
 import socket
+import selectors
 import threading
+import queue
+import time
 import sys
 import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import PORTAL_IP, PORTAL_PORT, BUFFER_SIZE, SOCKET_TIMEOUT
+from config import (
+    PORTAL_IP, PORTAL_PORT, BUFFER_SIZE, SOCKET_TIMEOUT, HTTP_ENGINE, LISTEN_BACKLOG,
+    HTTP_WORKERS, HTTP_QUEUE_SIZE, KEEPALIVE_TIMEOUT, KEEPALIVE_MAX_REQUESTS,
+    HTTP_STATS_INTERVAL, RATE_LIMIT_PROBE, RATE_LIMIT_LOGIN
+)
 from http_server.handlers import RequestHandler
+from http_server.request import RequestParser, RequestError, read_request
+from http_server.responses import (
+    OVERLOAD_RESPONSE, CONNECTION_KEEP_ALIVE, CONNECTION_CLOSE, TOO_MANY_REQUESTS
+)
+from http_server.probes import ProbeResponder
+from http_server.ratelimit import TokenBucketLimiter
+from log import get_logger
 
 
-class CaptivePortalServer:
+def send_response(sock, response: tuple, keep_alive: bool):
+    """Envía (cabecera, cuerpo) con un único sendmsg, sin concatenar."""
+    head, body = response
+    parts = [head, CONNECTION_KEEP_ALIVE if keep_alive else CONNECTION_CLOSE, body]
+    total = len(head) + len(parts[1]) + len(body)
+    sent = sock.sendmsg(parts)
+    if sent < total:
+        sock.sendall(b''.join(parts)[sent:])
+
+
+log = get_logger("HTTP")
+
+
+class PortalServerBase:
+    """
+    Partes comunes a los dos motores: socket de escucha, limitadores de tasa,
+    camino rápido de sondas, ejecución de handlers, rechazo por sobrecarga y
+    línea periódica de estadísticas (get_stats) en el log.
+    """
     
-    def __init__(self, session_manager, user_manager):
+    def __init__(self, session_manager, user_manager,
+                 host: str = PORTAL_IP, port: int = PORTAL_PORT):
         self.session_manager = session_manager
         self.user_manager = user_manager
+        self.host = host
+        self.port = port
         self.server_socket = None
         self.running = False
+        self.probe_limiter = TokenBucketLimiter(*RATE_LIMIT_PROBE)
+        self.login_limiter = TokenBucketLimiter(*RATE_LIMIT_LOGIN)
+        self.probes = ProbeResponder(session_manager, self.probe_limiter)
+        self.accepted = 0
+        self.rejected = 0
+        self.stats_interval = HTTP_STATS_INTERVAL
+        self._stats_stop = threading.Event()
     
-    def start(self):
+    def _listen(self):
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind((PORTAL_IP, PORTAL_PORT))
-        self.server_socket.listen()
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(LISTEN_BACKLOG)
+    
+    def _start_stats(self):
+        if not self.stats_interval:
+            return
+        threading.Thread(target=self._report_stats, name='portal-stats', daemon=True).start()
+    
+    def _report_stats(self):
+        while not self._stats_stop.wait(self.stats_interval):
+            log.info("Estadísticas del servidor", **self.get_stats())
+    
+    def get_stats(self) -> dict:
+        raise NotImplementedError
+    
+    def _fast_response(self, request, client_ip: str):
+        """Respuestas que no necesitan RequestHandler: sondas y límites de tasa."""
+        response = self.probes.respond(request.method, request.path, client_ip)
+        if response is not None:
+            return response
+        
+        if request.method == 'POST' and request.path in ('/login', '/'):
+            if not self.login_limiter.allow(client_ip):
+                log.warning("Límite de intentos de login superado", ip=client_ip)
+                return TOO_MANY_REQUESTS
+        return None
+    
+    def _process(self, request, client_address) -> tuple:
+        response = self._fast_response(request, client_address[0])
+        if response is not None:
+            return response
+        return self._run_handler(request, client_address)
+    
+    def _run_handler(self, request, client_address) -> tuple:
+        handler = RequestHandler(
+            self.session_manager,
+            self.user_manager,
+            client_address[0]
+        )
+        return handler.handle_request(request)
+    
+    def _shed(self, client_socket):
+        """Rechaza la conexión con una respuesta precodificada, sin bloquear."""
+        self.rejected += 1
+        try:
+            client_socket.setblocking(False)
+            client_socket.send(OVERLOAD_RESPONSE)
+        except OSError:
+            pass
+        finally:
+            client_socket.close()
+
+
+class _IdleConnection:
+    """Conexión persistente a la espera de su siguiente petición."""
+
+    __slots__ = ('sock', 'address', 'parser', 'served', 'since')
+
+    def __init__(self, sock, address, parser, served: int):
+        self.sock = sock
+        self.address = address
+        self.parser = parser
+        self.served = served
+        self.since = time.monotonic()
+
+
+class CaptivePortalServer(PortalServerBase):
+    """
+    Motor threaded: un pool fijo de workers alimentado por una cola acotada.
+    Entre peticiones, las conexiones persistentes no retienen un worker:
+    vuelven al thread de aceptación, que las vigila con un selector y las
+    encola de nuevo cuando llega la siguiente petición.
+    """
+    
+    def __init__(self, session_manager, user_manager,
+                 workers: int = HTTP_WORKERS, queue_size: int = HTTP_QUEUE_SIZE,
+                 host: str = PORTAL_IP, port: int = PORTAL_PORT):
+        super().__init__(session_manager, user_manager, host=host, port=port)
+        
+        # Pool fijo de workers alimentado por una cola acotada
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._worker_threads = []
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+        
+        # Conexiones persistentes inactivas: los workers las dejan en _parked
+        # y el thread de aceptación las registra en su selector
+        self._selector = None
+        self._parked = queue.SimpleQueue()
+        self._idle = {}   # {socket: _IdleConnection}
+        self._wakeup_r = None
+        self._wakeup_w = None
+    
+    def start(self):
+        self._listen()
+        self.server_socket.setblocking(False)
+        
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.server_socket, selectors.EVENT_READ, None)
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
         
         self.running = True
-        print(f"[HTTP] Servidor iniciado en http://{PORTAL_IP}:{PORTAL_PORT}")
+        self._start_workers()
+        self._start_stats()
+        log.info("Servidor iniciado", url=f"http://{self.host}:{self.port}",
+                 engine="threaded", workers=self.workers, queue=self._queue.maxsize)
         
         self._accept_loop()
     
+    def _start_workers(self):
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f"portal-worker-{i}",
+                daemon=True
+            )
+            thread.start()
+            self._worker_threads.append(thread)
+    
+    def _worker_loop(self):
+        # Buffer de recepción reutilizado por todas las conexiones del worker
+        view = memoryview(bytearray(BUFFER_SIZE))
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            with self._busy_lock:
+                self._busy += 1
+            try:
+                self._handle_client(*item, view)
+            finally:
+                with self._busy_lock:
+                    self._busy -= 1
+    
     def _accept_loop(self):
+        next_sweep = time.monotonic() + 1.0
         while self.running:
             try:
-                self.server_socket.settimeout(1.0)
+                events = self._selector.select(timeout=1.0)
+            except OSError:
+                if not self.running:
+                    break
+                raise
+            
+            for key, _ in events:
+                if key.fileobj is self.server_socket:
+                    self._accept()
+                elif key.fileobj is self._wakeup_r:
+                    self._watch_parked()
+                else:
+                    self._resume(key.data)
+            
+            now = time.monotonic()
+            if now >= next_sweep:
+                self._sweep_idle(now)
+                next_sweep = now + 1.0
+    
+    def _accept(self):
+        while True:
+            try:
                 client_socket, client_address = self.server_socket.accept()
-                
-                thread = threading.Thread(
-                    target=self._handle_client,
-                    args=(client_socket, client_address),
-                    daemon=True
-                )
-                thread.start()
-            except socket.timeout:
-                continue
-            except Exception as e:
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
                 if self.running:
-                    print(f"[HTTP] Error aceptando conexión: {e}")
+                    log.error("Error aceptando conexión", error=e)
+                return
+            
+            client_socket.setblocking(True)
+            try:
+                self._queue.put_nowait((client_socket, client_address, None, 0))
+                self.accepted += 1
+            except queue.Full:
+                self._shed(client_socket)
     
-    def _handle_client(self, client_socket, client_address):
+    def _park(self, client_socket, client_address, parser: RequestParser, served: int):
+        """Devuelve una conexión inactiva al thread de aceptación. Lo llama un worker."""
+        self._parked.put(_IdleConnection(client_socket, client_address, parser, served))
         try:
-            client_socket.settimeout(SOCKET_TIMEOUT)
-            
-            request_data = client_socket.recv(BUFFER_SIZE).decode('utf-8', errors='ignore')
-            print(request_data)
-            if not request_data:
+            self._wakeup_w.send(b'\0')
+        except OSError:
+            pass
+    
+    def _watch_parked(self):
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        
+        while True:
+            try:
+                conn = self._parked.get_nowait()
+            except queue.Empty:
                 return
+            if conn.sock.fileno() == -1:
+                continue
+            self._idle[conn.sock] = conn
+            self._selector.register(conn.sock, selectors.EVENT_READ, conn)
+    
+    def _resume(self, conn: _IdleConnection):
+        """Llegó la siguiente petición: la conexión vuelve a la cola de los workers."""
+        self._selector.unregister(conn.sock)
+        del self._idle[conn.sock]
+        try:
+            self._queue.put_nowait((conn.sock, conn.address, conn.parser, conn.served))
+        except queue.Full:
+            self._shed(conn.sock)
+    
+    def _sweep_idle(self, now: float):
+        deadline = now - KEEPALIVE_TIMEOUT
+        for conn in [c for c in self._idle.values() if c.since < deadline]:
+            self._selector.unregister(conn.sock)
+            del self._idle[conn.sock]
+            conn.sock.close()
+    
+    def _handle_client(self, client_socket, client_address, parser: RequestParser, served: int,
+                       view: memoryview):
+        try:
+            client_socket.settimeout(SOCKET_TIMEOUT)
+            if parser is None:
+                parser = RequestParser()
             
-            print("Handling")
-            handler = RequestHandler(
-                self.session_manager,
-                self.user_manager,
-                client_address[0]
-            )
-            
-            response = handler.handle_request(request_data)  
-            client_socket.send(response.encode('utf-8'))
+            while True:
+                try:
+                    request = read_request(client_socket, parser, view)
+                except RequestError as e:
+                    send_response(client_socket, RequestHandler.error_response(e.status, str(e)), False)
+                    return
+                except socket.timeout:
+                    return
+                if request is None:
+                    return
+                
+                served += 1
+                # Con conexiones en cola o todos los workers ocupados no se mantiene la conexión
+                keep_alive = (request.keep_alive()
+                              and served < KEEPALIVE_MAX_REQUESTS
+                              and self._queue.empty()
+                              and self._busy < self.workers)
+                
+                log.debug("Petición", sample="request", client=client_address[0],
+                          method=request.method, path=request.path)
+                response = self._process(request, client_address)
+                send_response(client_socket, response, keep_alive)
+                if not keep_alive:
+                    return
+                
+                # Las peticiones encadenadas (pipelining) que ya estén en el
+                # buffer del parser se atienden en orden en la siguiente vuelta;
+                # si no hay ninguna, la espera no ocupa el worker
+                if not parser.has_pending_data():
+                    self._park(client_socket, client_address, parser, served)
+                    client_socket = None
+                    return
         except Exception as e:
-            print(f"[HTTP] Error manejando cliente {client_address}: {e}")
+            log.error("Error manejando cliente", client=client_address[0], error=e)
         finally:
-            client_socket.close()
+            if client_socket is not None:
+                client_socket.close()
+    
+    def get_stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'queue_depth': self._queue.qsize(),
+            'queue_size': self._queue.maxsize,
+            'busy_workers': self._busy,
+            'idle_connections': len(self._idle),
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'probes': self.probes.hits,
+            'rate_limited_probes': self.probe_limiter.rejected,
+            'rate_limited_logins': self.login_limiter.rejected,
+        }
     
     def stop(self):
         self.running = False
+        self._stats_stop.set()
         if self.server_socket:
             self.server_socket.close()
-        print("[HTTP] Servidor detenido")
+        if self._wakeup_w:
+            try:
+                self._wakeup_w.send(b'\0')
+            except OSError:
+                pass
+        for conn in list(self._idle.values()):
+            conn.sock.close()
+        for _ in self._worker_threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        log.info("Servidor detenido")
+
+
+def create_server(session_manager, user_manager, engine: str = HTTP_ENGINE,
+                  host: str = PORTAL_IP, port: int = PORTAL_PORT):
+    """Crea el servidor del portal según el motor configurado."""
+    if engine == "eventloop":
+        from http_server.event_loop import EventLoopPortalServer
+        return EventLoopPortalServer(session_manager, user_manager, host=host, port=port)
+    if engine != "threaded":
+        log.warning("Motor desconocido, usando 'threaded'", engine=engine)
+    return CaptivePortalServer(session_manager, user_manager, host=host, port=port)
@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import threading
+import string
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import TEMPLATE_CHECK_INTERVAL
+
+
+class CompiledTemplate:
+    """
+    Plantilla precompilada: trozos estáticos ya codificados en UTF-8 y, entre
+    ellos, los nombres de los huecos a sustituir. Renderizar es un join de bytes.
+    """
+
+    __slots__ = ('chunks', 'slots', 'mtime')
+
+    def __init__(self, text: str, mtime: float = 0.0):
+        chunks = []
+        slots = []
+        literal = []
+        for literal_text, field_name, _, _ in string.Formatter().parse(text):
+            literal.append(literal_text)
+            if field_name is not None:
+                chunks.append(''.join(literal).encode('utf-8'))
+                slots.append(field_name)
+                literal = []
+        chunks.append(''.join(literal).encode('utf-8'))
+
+        self.chunks = chunks
+        self.slots = slots
+        self.mtime = mtime
+
+    def render(self, **values) -> bytes:
+        if not self.slots:
+            return self.chunks[0]
+        parts = [self.chunks[0]]
+        for slot, chunk in zip(self.slots, self.chunks[1:]):
+            value = values.get(slot, '')
+            parts.append(value if isinstance(value, bytes) else str(value).encode('utf-8'))
+            parts.append(chunk)
+        return b''.join(parts)
+
+
+class TemplateCache:
+    """
+    Caché de plantillas compiladas. Cada plantilla se lee una vez y sólo se
+    recarga si su mtime cambia; el mtime se comprueba como mucho cada
+    `check_interval` segundos para no tocar disco en cada petición.
+    """
+
+    def __init__(self, directory: str, check_interval: float = TEMPLATE_CHECK_INTERVAL):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._templates = {}   # {name: CompiledTemplate}
+        self._checked = {}     # {name: monotonic de la última comprobación}
+        self._static = {}      # {(name, valores): (mtime, bytes)}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CompiledTemplate:
+        now = time.monotonic()
+        template = self._templates.get(name)
+        if template is not None and now - self._checked.get(name, 0) < self.check_interval:
+            return template
+
+        with self._lock:
+            self._checked[name] = now
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                return CompiledTemplate(
+                    f"<html><body><h1>Error: Template '{name}' not found</h1></body></html>"
+                )
+
+            template = self._templates.get(name)
+            if template is None or template.mtime != mtime:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        template = CompiledTemplate(f.read(), mtime)
+                except Exception as e:
+                    return CompiledTemplate(f"<html><body><h1>Error loading template: {e}</h1></body></html>")
+                self._templates[name] = template
+            return template
+
+    def render(self, name: str, **values) -> bytes:
+        return self.get(name).render(**values)
+
+    def render_static(self, name: str, **values) -> bytes:
+        """Renderiza una página sin datos por petición y guarda el resultado completo."""
+        template = self.get(name)
+        key = (name, tuple(sorted(values.items())))
+        cached = self._static.get(key)
+        if cached is not None and cached[0] == template.mtime:
+            return cached[1]
+        body = template.render(**values)
+        self._static[key] = (template.mtime, body)
+        return body
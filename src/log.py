@@ -0,0 +1,161 @@
+"""
+NetGuard - Logging estructurado y asíncrono.
+
+Los registros son líneas `fecha NIVEL [TAG] mensaje clave=valor ...`. La
+emisión sólo encola el registro (sin formatear) en una cola acotada; un
+thread en segundo plano lo formatea y lo escribe. Si la cola se llena, el
+registro se descarta y se contabiliza en lugar de bloquear al llamante.
+
+Uso:
+    from log import get_logger
+    log = get_logger("SESSION")
+    log.info("Nueva sesión", user=username, ip=ip)
+    log.debug("Sonda", sample="probe", path=path)   # muestreo 1 de N
+"""
+import sys
+import os
+import time
+import queue
+import atexit
+import logging
+import itertools
+import threading
+import logging.handlers
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import LOG_LEVEL, LOG_QUEUE_SIZE, LOG_SAMPLE_RATES
+
+
+_ROOT = "netguard"
+
+_listener = None
+_handler = None
+_setup_lock = threading.Lock()
+_sample_counters = {}
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Encola sin bloquear y sin formatear en el thread llamante."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class KeyValueFormatter(logging.Formatter):
+
+    def format(self, record) -> str:
+        ts = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))
+        parts = [ts, record.levelname, f"[{getattr(record, 'tag', '-')}]", record.getMessage()]
+        for key, value in getattr(record, 'fields', {}).items():
+            parts.append(f"{key}={_format_value(value)}")
+        line = ' '.join(parts)
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+def _escape(char: str) -> str:
+    if char == '"' or char == '\\':
+        return '\\' + char
+    if char.isprintable():
+        return char
+    # \n, \r, \x1b, \u2028...: un valor nunca puede partir la línea ni falsear otro registro
+    return char.encode('unicode_escape').decode('ascii')
+
+
+def _format_value(value) -> str:
+    text = 'N/A' if value is None else str(value)
+    if text and text.isprintable() and not any(c in text for c in ' ="\\'):
+        return text
+    return '"' + ''.join(_escape(c) for c in text) + '"'
+
+
+def setup_logging(level: str = LOG_LEVEL, stream=None):
+    """Arranca el writer en segundo plano. Se llama solo al pedir el primer logger."""
+    global _listener, _handler
+    with _setup_lock:
+        if _handler is not None:
+            return
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        writer = logging.StreamHandler(stream or sys.stdout)
+        writer.setFormatter(KeyValueFormatter())
+
+        _handler = _DroppingQueueHandler(log_queue)
+        root = logging.getLogger(_ROOT)
+        root.setLevel(getattr(logging, level.upper(), logging.INFO))
+        root.addHandler(_handler)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, writer)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Vacía la cola y detiene el writer."""
+    global _listener
+    with _setup_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+
+
+def set_log_stream(stream):
+    """Cambia el destino del writer (p. ej. a stderr cuando stdout lleva datos)."""
+    if _listener is not None:
+        for handler in _listener.handlers:
+            handler.setStream(stream)
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler else 0
+
+
+class StructuredLogger:
+
+    def __init__(self, tag: str):
+        self.tag = tag
+        self._logger = logging.getLogger(f"{_ROOT}.{tag.lower()}")
+
+    def _log(self, level: int, msg: str, sample, exc_info, fields: dict):
+        if not self._logger.isEnabledFor(level):
+            return
+        if sample is not None:
+            rate = LOG_SAMPLE_RATES.get(sample, 1)
+            if rate > 1:
+                counter = _sample_counters.setdefault(sample, itertools.count())
+                if next(counter) % rate:
+                    return
+                fields['sampled'] = rate
+        self._logger.log(level, msg, exc_info=exc_info,
+                         extra={'tag': self.tag, 'fields': fields})
+
+    def debug(self, msg: str, sample: str = None, **fields):
+        self._log(logging.DEBUG, msg, sample, None, fields)
+
+    def info(self, msg: str, sample: str = None, **fields):
+        self._log(logging.INFO, msg, sample, None, fields)
+
+    def warning(self, msg: str, sample: str = None, **fields):
+        self._log(logging.WARNING, msg, sample, None, fields)
+
+    def error(self, msg: str, sample: str = None, exc_info=None, **fields):
+        self._log(logging.ERROR, msg, sample, exc_info, fields)
+
+
+def get_logger(tag: str) -> StructuredLogger:
+    if _handler is None:
+        setup_logging()
+    return StructuredLogger(tag)
@@ -4,6 +4,8 @@ Punto de entrada principal.
 
 Uso:
     sudo python3 main.py [opciones]
+    python3 main.py users import usuarios.csv [--batch-size N] [--workers N]
+    python3 main.py users export usuarios.jsonl
     
 Opciones:
     --add-user       Modo para agregar usuarios
@@ -17,10 +19,15 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import config
 from firewall.manager import FirewallManager
+from firewall.accounting import TrafficCollector
+from firewall.reconcile import FirewallReconciler
 from auth.users import UserManager
+from auth.storage import create_store
+from auth.bulk import import_users, export_users, DEFAULT_BATCH_SIZE
 from auth.sessions import SessionManager
-from http_server.server import CaptivePortalServer
+from http_server.server import create_server
 from gateway.preconfig import apply_gateway_preconfig
+from log import shutdown_logging, set_log_stream
 
 
 # Variables globales para cleanup
@@ -28,6 +35,8 @@ firewall = None
 session_manager = None
 http_server = None
 wifi_manager = None
+traffic_collector = None
+firewall_reconciler = None
 
 
 
@@ -39,9 +48,13 @@ def signal_handler(sig, frame):
 
 def cleanup():
     """Limpia recursos al cerrar."""
-    global http_server, session_manager, firewall, wifi_manager
+    global http_server, session_manager, firewall, wifi_manager, traffic_collector, firewall_reconciler
     
     
+    if traffic_collector:
+        traffic_collector.stop()
+    if firewall_reconciler:
+        firewall_reconciler.stop()
     if http_server:
         http_server.stop()
     if session_manager:
@@ -50,6 +63,7 @@ def cleanup():
         firewall.cleanup()
     if wifi_manager:
         wifi_manager.stop_hotspot()
+    shutdown_logging()
 
 
 def add_user_mode():
@@ -67,12 +81,38 @@ def add_user_mode():
         print("Error: Usuario y contraseña requeridos.")
 
 
+def users_mode(args):
+    # stdout puede ser la propia exportación
+    set_log_stream(sys.stderr)
+    store = create_store(args.backend) if args.backend else create_store()
+    try:
+        if args.action == 'import':
+            summary = import_users(store, args.file, args.format, args.batch_size, args.workers)
+            print(f"Importados {summary['added']} de {summary['read']} usuarios "
+                  f"({summary['skipped']} ya existían, {summary['invalid']} inválidos) "
+                  f"en {summary['seconds']}s: {summary['users_per_second']} usuarios/s")
+        else:
+            summary = export_users(store, args.file, args.format)
+            print(f"Exportados {summary['exported']} usuarios en {summary['seconds']}s: "
+                  f"{summary['users_per_second']} usuarios/s", file=sys.stderr)
+    finally:
+        store.close()
+
+
 def main():
-    global firewall, session_manager, http_server, wifi_manager
+    global firewall, session_manager, http_server, wifi_manager, traffic_collector, firewall_reconciler
     
     # Parsear argumentos
     parser = argparse.ArgumentParser(description='NetGuard - Portal Cautivo')
     parser.add_argument('--add-user', action='store_true', help='Agregar usuario')
+    commands = parser.add_subparsers(dest='command')
+    users_parser = commands.add_parser('users', help='Importar/exportar usuarios en bloque')
+    users_parser.add_argument('action', choices=('import', 'export'))
+    users_parser.add_argument('file', help="Fichero CSV o JSONL ('-' para stdin/stdout)")
+    users_parser.add_argument('--format', choices=('csv', 'jsonl'), help='Por defecto, según la extensión')
+    users_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Usuarios por escritura')
+    users_parser.add_argument('--workers', type=int, help='Procesos de hash (por defecto, uno por núcleo)')
+    users_parser.add_argument('--backend', choices=('json', 'sqlite'), help='Backend de usuarios')
     args = parser.parse_args()
     
     # Modo agregar usuario
@@ -80,6 +120,10 @@ def main():
         add_user_mode()
         return
     
+    if args.command == 'users':
+        users_mode(args)
+        return
+    
     # Banner
     print("=" * 50)
     print("     NETGUARD - Portal Cautivo")
@@ -139,9 +183,13 @@ def main():
     
     print(f"[{3+step_offset}/4] Iniciando gestor de sesiones...")
     session_manager = SessionManager(firewall)
+    traffic_collector = TrafficCollector(firewall, session_manager)
+    traffic_collector.start()
+    firewall_reconciler = FirewallReconciler(firewall, session_manager)
+    firewall_reconciler.start()
     
     print(f"[{4+step_offset}/4] Iniciando servidor HTTP...")
-    http_server = CaptivePortalServer(session_manager, user_manager)
+    http_server = create_server(session_manager, user_manager)
     
     print(f"\n" + "=" * 50)
     print(f"Portal activo en: http://{config.PORTAL_IP}:{config.PORTAL_PORT}")
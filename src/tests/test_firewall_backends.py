@@ -0,0 +1,227 @@
+"""
+Paridad entre IptablesBackend y NftablesBackend.
+
+Ambos backends se ejecutan sobre un RecordingRunner con el mismo conjunto
+de sesiones y se comparan sus payloads por significado (qué pares ip+mac
+autorizan o revocan, qué contadores devuelven), no por texto.
+
+Uso:
+    python3 -m unittest discover -s tests
+"""
+import re
+import sys
+import os
+import json
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import PORTAL_PORT, WAN_INTERFACE
+from firewall.backends import IptablesBackend, NftablesBackend, RecordingRunner
+
+
+CLIENTS = [
+    ("192.168.100.101", "aa:bb:cc:00:00:01"),
+    ("192.168.100.102", "aa:bb:cc:00:00:02"),
+    ("192.168.100.103", "aa:bb:cc:00:00:03"),
+]
+
+# {ip: (bytes_subida, bytes_bajada, paquetes)}
+COUNTERS = {
+    "192.168.100.101": (1500, 42000, 40),
+    "192.168.100.102": (0, 600, 3),
+}
+
+_IPTABLES_CLIENT = re.compile(r'^-([ID]) FORWARD -s (\S+) -m mac --mac-source (\S+) -j ACCEPT$')
+_IPTABLES_DOWNLOAD = re.compile(r'^-([ID]) FORWARD -d (\S+)$')
+_NFT_ELEMENTS = re.compile(r'^(add|delete) element ip netguard (\w+) \{ (.*) \}$')
+
+
+def iptables_changes(payload: str) -> dict:
+    """{('I'|'D', 'clients'|'download'): {entradas}} de un payload de iptables-restore."""
+    changes = {}
+    for line in payload.splitlines():
+        match = _IPTABLES_CLIENT.match(line)
+        if match:
+            changes.setdefault((match.group(1), 'clients'), set()).add((match.group(2), match.group(3)))
+            continue
+        match = _IPTABLES_DOWNLOAD.match(line)
+        if match:
+            changes.setdefault((match.group(1), 'download'), set()).add(match.group(2))
+    return changes
+
+
+def nft_changes(payload: str) -> dict:
+    """Lo mismo para un script de `nft -f -`, con add/delete traducidos a I/D."""
+    changes = {}
+    for line in payload.splitlines():
+        match = _NFT_ELEMENTS.match(line)
+        if match is None:
+            continue
+        op = 'I' if match.group(1) == 'add' else 'D'
+        for element in match.group(3).split(', '):
+            parts = tuple(element.split(' . '))
+            changes.setdefault((op, match.group(2)), set()).add(parts if len(parts) > 1 else parts[0])
+    return changes
+
+
+def iptables_save_output(counters: dict) -> str:
+    lines = ["*filter", ":FORWARD DROP [0:0]"]
+    for ip, (up, down, packets) in counters.items():
+        mac = dict(CLIENTS)[ip].upper()
+        # Reparte los paquetes entre las dos reglas, como haría el kernel
+        lines.append(f"[{packets - packets // 2}:{up}] -A FORWARD -s {ip}/32 -m mac --mac-source {mac} -j ACCEPT")
+        lines.append(f"[{packets // 2}:{down}] -A FORWARD -d {ip}/32")
+    lines.append("[900:90000] -A FORWARD -m state --state RELATED,ESTABLISHED -j ACCEPT")
+    lines.append("COMMIT")
+    return '\n'.join(lines) + '\n'
+
+
+def nft_list_output(counters: dict) -> str:
+    clients, download = [], []
+    for ip, (up, down, packets) in counters.items():
+        clients.append({"elem": {"val": {"concat": [ip, dict(CLIENTS)[ip]]},
+                                 "counter": {"packets": packets - packets // 2, "bytes": up}}})
+        download.append({"elem": {"val": ip, "counter": {"packets": packets // 2, "bytes": down}}})
+    return json.dumps({"nftables": [
+        {"metainfo": {"json_schema_version": 1}},
+        {"table": {"family": "ip", "name": "netguard"}},
+        {"set": {"family": "ip", "name": "clients", "table": "netguard", "elem": clients}},
+        {"set": {"family": "ip", "name": "download", "table": "netguard", "elem": download}},
+    ]})
+
+
+class BackendParityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ipt_runner = RecordingRunner()
+        self.nft_runner = RecordingRunner()
+        self.iptables = IptablesBackend(self.ipt_runner)
+        self.nftables = NftablesBackend(self.nft_runner)
+
+    def _only_call(self, runner: RecordingRunner, program: str) -> tuple:
+        calls = [(argv, payload) for argv, payload in runner.calls if argv[0] == program]
+        self.assertEqual(len(calls), 1, runner.commands())
+        return calls[0]
+
+    def test_initialize_is_one_transaction_with_the_same_policy(self):
+        self.assertTrue(self.iptables.initialize())
+        self.assertTrue(self.nftables.initialize())
+
+        argv, ipt_payload = self._only_call(self.ipt_runner, 'iptables-restore')
+        self.assertNotIn('--noflush', argv)
+        _, nft_payload = self._only_call(self.nft_runner, 'nft')
+
+        self.assertIn(":FORWARD DROP", ipt_payload)
+        self.assertIn("type filter hook forward priority filter; policy drop;", nft_payload)
+        self.assertIn(f"--dport {PORTAL_PORT} -j ACCEPT", ipt_payload)
+        self.assertIn(f"tcp dport {PORTAL_PORT} accept", nft_payload)
+        self.assertIn(f"-o {WAN_INTERFACE} -j MASQUERADE", ipt_payload)
+        self.assertIn(f'oifname "{WAN_INTERFACE}" masquerade', nft_payload)
+        # Ningún cliente autorizado tras arrancar
+        self.assertEqual(iptables_changes(ipt_payload), {})
+        self.assertEqual(nft_changes(nft_payload), {})
+
+        for runner in (self.ipt_runner, self.nft_runner):
+            self.assertIn('sysctl -w net.ipv4.ip_forward=1', runner.commands())
+
+    def test_authorize_payloads_match(self):
+        self.assertTrue(self.iptables.authorize(CLIENTS))
+        self.assertTrue(self.nftables.authorize(CLIENTS))
+
+        _, ipt_payload = self._only_call(self.ipt_runner, 'iptables-restore')
+        _, nft_payload = self._only_call(self.nft_runner, 'nft')
+        expected = {
+            ('I', 'clients'): set(CLIENTS),
+            ('I', 'download'): {ip for ip, _ in CLIENTS},
+        }
+        self.assertEqual(iptables_changes(ipt_payload), expected)
+        self.assertEqual(nft_changes(nft_payload), expected)
+
+    def test_revoke_payloads_match(self):
+        self.assertTrue(self.iptables.revoke(CLIENTS))
+        self.assertTrue(self.nftables.revoke(CLIENTS))
+
+        _, ipt_payload = self._only_call(self.ipt_runner, 'iptables-restore')
+        _, nft_payload = self._only_call(self.nft_runner, 'nft')
+        expected = {
+            ('D', 'clients'): set(CLIENTS),
+            ('D', 'download'): {ip for ip, _ in CLIENTS},
+        }
+        self.assertEqual(iptables_changes(ipt_payload), expected)
+        self.assertEqual(nft_changes(nft_payload), expected)
+        # Revocar no deja reglas nuevas en FORWARD
+        self.assertNotIn('-I FORWARD', ipt_payload)
+        self.assertNotIn('-j DROP', ipt_payload)
+
+        conntrack = [c for c in self.ipt_runner.commands() if c.startswith('conntrack')]
+        self.assertEqual(len(conntrack), 2 * len(CLIENTS))
+        self.assertEqual(conntrack, [c for c in self.nft_runner.commands() if c.startswith('conntrack')])
+
+    def test_mixed_batch_revokes_before_authorizing(self):
+        revoke, authorize = CLIENTS[:1], CLIENTS[1:]
+        self.assertTrue(self.iptables.apply(authorize, revoke))
+        self.assertTrue(self.nftables.apply(authorize, revoke))
+
+        _, ipt_payload = self._only_call(self.ipt_runner, 'iptables-restore')
+        _, nft_payload = self._only_call(self.nft_runner, 'nft')
+        self.assertEqual(iptables_changes(ipt_payload), nft_changes(nft_payload))
+        for payload, delete, add in ((ipt_payload, '-D FORWARD', '-I FORWARD'),
+                                     (nft_payload, 'delete element', 'add element')):
+            self.assertLess(payload.index(delete), payload.index(add))
+
+    def test_empty_batch_runs_nothing(self):
+        self.assertTrue(self.iptables.apply([], []))
+        self.assertTrue(self.nftables.apply([], []))
+        self.assertEqual(self.ipt_runner.calls, [])
+        self.assertEqual(self.nft_runner.calls, [])
+
+    def test_counters_match(self):
+        self.ipt_runner.outputs['iptables-save'] = iptables_save_output(COUNTERS)
+        self.nft_runner.outputs['nft'] = nft_list_output(COUNTERS)
+
+        self.assertEqual(self.iptables.read_counters(), COUNTERS)
+        self.assertEqual(self.nftables.read_counters(), COUNTERS)
+        # Una sola lectura por pasada
+        self.assertEqual(len(self.ipt_runner.calls), 1)
+        self.assertEqual(len(self.nft_runner.calls), 1)
+
+
+class BackendFailureParityTest(unittest.TestCase):
+    """Con el runner fallando, ambos backends informan igual y no lanzan."""
+
+    def setUp(self):
+        self.iptables = IptablesBackend(RecordingRunner(failing={'iptables-restore', 'iptables', 'iptables-save'}))
+        self.nftables = NftablesBackend(RecordingRunner(failing={'nft'}))
+
+    def test_initialize_fails(self):
+        self.assertFalse(self.iptables.initialize())
+        self.assertFalse(self.nftables.initialize())
+
+    def test_authorize_fails(self):
+        self.assertFalse(self.iptables.authorize(CLIENTS))
+        self.assertFalse(self.nftables.authorize(CLIENTS))
+
+    def test_revoke_fails(self):
+        self.assertFalse(self.iptables.revoke(CLIENTS))
+        self.assertFalse(self.nftables.revoke(CLIENTS))
+
+    def test_revoking_missing_rules_is_not_a_failure(self):
+        gone = {'iptables-restore': 'iptables-restore: line 3 failed',
+                'iptables': 'iptables: Bad rule (does a matching rule exist in that chain?).',
+                'nft': 'Error: Could not process rule: No such file or directory'}
+        self.assertTrue(IptablesBackend(RecordingRunner(failing=gone)).revoke(CLIENTS))
+        self.assertTrue(NftablesBackend(RecordingRunner(failing=gone)).revoke(CLIENTS))
+
+    def test_failed_authorize_does_not_touch_conntrack(self):
+        self.iptables.authorize(CLIENTS)
+        self.nftables.authorize(CLIENTS)
+        for backend in (self.iptables, self.nftables):
+            self.assertFalse([c for c in backend.runner.commands() if c.startswith('conntrack')])
+
+    def test_counters_are_empty(self):
+        self.assertEqual(self.iptables.read_counters(), {})
+        self.assertEqual(self.nftables.read_counters(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
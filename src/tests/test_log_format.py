@@ -0,0 +1,48 @@
+"""
+Formato clave=valor del logger: un valor no puede romper la línea ni
+inyectar registros o campos falsos.
+
+Uso:
+    python3 -m unittest discover -s tests
+"""
+import sys
+import os
+import logging
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log import KeyValueFormatter, _format_value
+
+
+class FormatValueTest(unittest.TestCase):
+
+    def test_plain_values_are_not_quoted(self):
+        self.assertEqual(_format_value('admin'), 'admin')
+        self.assertEqual(_format_value(42), '42')
+        self.assertEqual(_format_value(None), 'N/A')
+
+    def test_separators_are_quoted(self):
+        self.assertEqual(_format_value('a b'), '"a b"')
+        self.assertEqual(_format_value('k=v'), '"k=v"')
+        self.assertEqual(_format_value(''), '""')
+        self.assertEqual(_format_value('di "hola"'), '"di \\"hola\\""')
+        self.assertEqual(_format_value('c:\\x'), '"c:\\\\x"')
+
+    def test_control_characters_are_escaped(self):
+        self.assertEqual(_format_value('a\nb'), '"a\\nb"')
+        self.assertEqual(_format_value('a\r\nb'), '"a\\r\\nb"')
+        self.assertEqual(_format_value('\x1b[31m'), '"\\x1b[31m"')
+        self.assertEqual(_format_value('a\u2028b'), '"a\\u2028b"')
+
+    def test_injected_username_stays_on_one_line(self):
+        username = 'x\n2026-01-01T00:00:00 INFO [AUTH] Login exitoso user=admin ip=10.0.0.1'
+        record = logging.LogRecord('netguard.auth', logging.WARNING, __file__, 0, "Login fallido", (), None)
+        record.tag = 'AUTH'
+        record.fields = {'user': username, 'ip': '192.168.100.150'}
+        line = KeyValueFormatter().format(record)
+        self.assertNotIn('\n', line)
+        self.assertTrue(line.endswith(' ip=192.168.100.150'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Login con la verificación de contraseñas saturada: el portal responde 503
+en lugar de dejar el thread HTTP esperando al pool de KDF.
+
+Uso:
+    python3 -m unittest discover -s tests
+"""
+import sys
+import os
+import time
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import PASSWORD_QUEUE_SIZE, HTTP_WORKERS, EVENT_LOOP_HANDLER_THREADS
+from auth.passwords import PasswordVerifier, VerifierBusy
+from auth.storage import JSONUserStore
+from auth.users import UserManager
+from http_server.handlers import RequestHandler
+from http_server.request import HTTPRequest
+from http_server.responses import SERVICE_UNAVAILABLE
+
+
+class NoSessions:
+
+    def is_authenticated(self, ip_address: str) -> bool:
+        return False
+
+    def create_session(self, ip_address: str, username: str) -> bool:
+        return True
+
+
+def login_request(username: str, password: str) -> HTTPRequest:
+    body = f"username={username}&password={password}".encode()
+    return HTTPRequest('POST', '/login', '', 'HTTP/1.1',
+                       {'content-length': str(len(body))}, body)
+
+
+class LoginOverloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.verifier = PasswordVerifier(workers=1, queue_size=1)
+        self.users = UserManager(JSONUserStore(os.path.join(self.tmp.name, 'users.json')), self.verifier)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.verifier.shutdown()
+        self.tmp.cleanup()
+
+    def _saturate(self):
+        # Ocupa la única plaza del pool hasta el final del test
+        self.verifier.submit(self.release.wait)
+
+    def _login(self, username: str, password: str) -> tuple:
+        handler = RequestHandler(NoSessions(), self.users, '192.168.100.150')
+        return handler.handle_request(login_request(username, password))
+
+    def test_saturated_verifier_answers_503(self):
+        self._saturate()
+        start = time.monotonic()
+        self.assertEqual(self._login('admin', 'admin123'), SERVICE_UNAVAILABLE)
+        # Sin esperar al KDF
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(self.verifier.rejected, 1)
+
+    def test_unknown_user_goes_through_the_verifier(self):
+        # Un usuario inexistente paga el mismo KDF: también se rechaza con el pool lleno
+        self._saturate()
+        self.assertEqual(self._login('nadie', 'x'), SERVICE_UNAVAILABLE)
+
+    def test_unknown_user_costs_a_kdf(self):
+        def elapsed(username):
+            start = time.perf_counter()
+            self.assertFalse(self.users.authenticate(username, 'incorrecta'))
+            return time.perf_counter() - start
+
+        elapsed('admin')   # calentamiento
+        known, unknown = elapsed('admin'), elapsed('nadie')
+        # El tiempo no distingue un usuario existente de uno inexistente
+        self.assertGreater(unknown, known / 2)
+        self.assertLess(unknown, known * 2)
+
+    def test_known_user_still_logs_in(self):
+        self.assertTrue(self.users.authenticate('admin', 'admin123'))
+        self.assertFalse(self.users.authenticate('admin', 'otra'))
+
+    def test_default_limit_leaves_http_threads_free(self):
+        self.assertLess(PASSWORD_QUEUE_SIZE, HTTP_WORKERS)
+        self.assertLess(PASSWORD_QUEUE_SIZE, EVENT_LOOP_HANDLER_THREADS)
+
+
+if __name__ == '__main__':
+    unittest.main()